@@ -0,0 +1,433 @@
+"""
+
+This module contains benchmark suite for simulation hot paths. Scenarios
+run on real maps from resources/maps.json with dummy SDL video driver
+and report ticks per second together with time and allocations of
+Turret.find_target, SpatialHash.rebuild, EnemyPool.update,
+ProjectilePool.update and EnemySpawner.update. Results can be saved as
+JSON baseline and compared with a baseline from another commit
+
+Usage:
+python3 benchmark.py --save baseline.json
+python3 benchmark.py --compare baseline.json
+python3 benchmark.py --snapshot 10000
+
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pygame as pg
+from pygame.surface import Surface
+
+import headless
+import snapshot
+from enemypool import EnemyPool
+from levelstate import Level, LevelState, Turret, Enemy, EnemySpawner
+from projectilepool import ProjectilePool
+from spatialhash import SpatialHash
+from statemachine import StateMachine
+
+
+class HotPath:
+    """
+
+    Replaces a method with a wrapper measuring calls, time and, when
+    tracemalloc is running, bytes allocated during each call.
+
+    """
+
+    def __init__(self, name, owner, attribute):
+        self.name = name
+        self.owner = owner
+        self.attribute = attribute
+        self.original = getattr(owner, attribute)
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.seconds = 0
+        self.allocated = 0
+
+    def install(self, trace_memory):
+        original = self.original
+
+        def measured(*args, **kwargs):
+            self.calls += 1
+
+            if trace_memory:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+
+            start = time.perf_counter()
+            result = original(*args, **kwargs)
+            self.seconds += time.perf_counter() - start
+
+            if trace_memory:
+                self.allocated += tracemalloc.get_traced_memory()[1] - before
+
+            return result
+
+        setattr(self.owner, self.attribute, measured)
+
+    def remove(self):
+        setattr(self.owner, self.attribute, self.original)
+
+
+HOT_PATHS = [
+    HotPath("Turret.find_target", Turret, "find_target"),
+    HotPath("SpatialHash.rebuild", SpatialHash, "rebuild"),
+    HotPath("EnemyPool.update", EnemyPool, "update"),
+    HotPath("ProjectilePool.update", ProjectilePool, "update"),
+    HotPath("EnemySpawner.update", EnemySpawner, "update"),
+]
+
+
+def make_level(resource_manager, level_name):
+    level = Level(resource_manager, level_name)
+    level.money = 10 ** 9
+    return level
+
+
+def place_turrets(level, per_type):
+    tile_id = 0
+    for turret_type in range(len(Turret.BASE_STATS)):
+        for _ in range(per_type):
+            if tile_id >= len(level.tiles):
+                return
+            level.place_turret(tile_id, turret_type)
+            tile_id += 1
+
+
+# enemies enter one group per tick so they spread along the path
+def spread_enemies(level, count, ticks=240):
+    level.health = 10 ** 9
+    per_tick = max(count // ticks, 1)
+
+    while len(level.enemies) < count:
+        for _ in range(min(per_tick, count - len(level.enemies))):
+            enemy = Enemy(level.spawn_points[0], len(level.enemies) % 3, 1)
+            Enemy.pool.hp[enemy.index] = 10 ** 9
+            level.enemies.append(enemy)
+        level.enemy_pool.update(Level.TICK)
+
+
+def scenario_turrets(resource_manager, per_type, enemies, ticks):
+    def setup():
+        level = make_level(resource_manager, "LEVEL 3")
+        place_turrets(level, per_type)
+        spread_enemies(level, enemies)
+        # no new waves during the measurement
+        level.max_wave = 0
+        return level
+
+    def run(level):
+        for _ in range(ticks):
+            level.step(Level.TICK)
+        return ticks
+
+    return setup, run
+
+
+def scenario_projectiles(resource_manager, projectiles, ticks):
+    random = np.random.RandomState(0)
+
+    def setup():
+        level = make_level(resource_manager, "LEVEL 3")
+        spread_enemies(level, 500)
+        level.max_wave = 0
+        return level
+
+    def run(level):
+        pool = level.projectiles
+        map_size = (len(level.tile_map[0]) * Level.TILE_SIZE,
+                    len(level.tile_map) * Level.TILE_SIZE)
+
+        for _ in range(ticks):
+            # keep pool saturated with projectiles flying from far away
+            while len(pool) < projectiles:
+                target = level.enemies[random.randint(len(level.enemies))]
+                pool.spawn((random.randint(map_size[0]),
+                            random.randint(map_size[1])), 0, target.index,
+                           target.generation, 1, 500)
+            level.step(Level.TICK)
+        return ticks
+
+    return setup, run
+
+
+def scenario_full_level(resource_manager, level_name, max_ticks):
+    def setup():
+        level = make_level(resource_manager, level_name)
+        place_turrets(level, len(level.tiles))
+        for turret in level.turrets:
+            for _ in range(10):
+                level.upgrade_turret(turret)
+        return level
+
+    def run(level):
+        while level.finished is False and level.tick < max_ticks:
+            level.step(Level.TICK)
+        return level.tick
+
+    return setup, run
+
+
+def scenario_draw(resource_manager, frames):
+    def setup():
+        state = headless.make_level_state(resource_manager, "LEVEL 3")
+        state.level.money = 10 ** 9
+        place_turrets(state.level, 10)
+        spread_enemies(state.level, 1000)
+        state.level.max_wave = 0
+        return state
+
+    def run(state):
+        for _ in range(frames):
+            state.update(Level.TICK)
+            state.draw()
+        return state.level.tick
+
+    return setup, run
+
+
+# level state with half of entities as enemies and half as projectiles
+def snapshot_benchmark(resource_manager, entities, path, repeats=5):
+    random = np.random.RandomState(0)
+
+    state = headless.make_level_state(resource_manager, "LEVEL 3")
+    level = state.level
+    level.money = 10 ** 9
+    place_turrets(level, len(level.tiles))
+    spread_enemies(level, entities // 2)
+
+    for _ in range(entities - entities // 2):
+        target = level.enemies[random.randint(len(level.enemies))]
+        level.projectiles.spawn((random.randint(1024), random.randint(768)),
+                                0, target.index, target.generation, 1, 500)
+
+    times = {"capture": [], "write": [], "load": [], "restore": []}
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        data = state.snapshot()
+        times["capture"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        snapshot.write(data, path)
+        times["write"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        data = snapshot.load(path)
+        times["load"].append(time.perf_counter() - start)
+
+        restored = LevelState(Surface(StateMachine.SCREEN_SIZE),
+                              resource_manager)
+        start = time.perf_counter()
+        restored.restore(Surface(StateMachine.SCREEN_SIZE), data)
+        times["restore"].append(time.perf_counter() - start)
+
+    result = {name: min(values) for name, values in times.items()}
+    result["entities"] = (len(level.enemies) + len(level.projectiles) +
+                          len(level.turrets))
+    result["bytes"] = os.path.getsize(path)
+    os.remove(path)
+
+    return result
+
+
+def make_scenarios(resource_manager, quick):
+    scale = 0.2 if quick else 1
+
+    return {
+        "turrets_10x3_vs_1000": scenario_turrets(
+            resource_manager, 10, int(1000 * scale), int(600 * scale)),
+        "turrets_30x3_vs_3000": scenario_turrets(
+            resource_manager, 30, int(3000 * scale), int(300 * scale)),
+        "enemies_10000": scenario_turrets(
+            resource_manager, 0, int(10000 * scale), int(300 * scale)),
+        "projectiles_5000": scenario_projectiles(
+            resource_manager, int(5000 * scale), int(600 * scale)),
+        "level3_full": scenario_full_level(
+            resource_manager, "LEVEL 3", 3000 if quick else 10 ** 6),
+        "draw_level3_1000": scenario_draw(resource_manager,
+                                          int(600 * scale)),
+    }
+
+
+def measure(setup, run, trace_memory):
+    for hot_path in HOT_PATHS:
+        hot_path.reset()
+
+    subject = setup()
+
+    if trace_memory:
+        tracemalloc.start()
+
+    for hot_path in HOT_PATHS:
+        hot_path.install(trace_memory)
+
+    try:
+        start = time.perf_counter()
+        ticks = run(subject)
+        seconds = time.perf_counter() - start
+    finally:
+        for hot_path in HOT_PATHS:
+            hot_path.remove()
+        if trace_memory:
+            tracemalloc.stop()
+
+    functions = {hot_path.name: {"calls": hot_path.calls,
+                                 "seconds": hot_path.seconds,
+                                 "allocated_bytes": hot_path.allocated}
+                 for hot_path in HOT_PATHS}
+
+    return ticks, seconds, functions
+
+
+def run_scenario(setup, run, allocations):
+    ticks, seconds, functions = measure(setup, run, False)
+
+    result = {
+        "ticks": ticks,
+        "seconds": seconds,
+        "ticks_per_second": ticks / seconds if seconds > 0 else 0,
+        "functions": functions,
+    }
+
+    # second run because tracemalloc slows everything down
+    if allocations:
+        _, _, traced = measure(setup, run, True)
+        for name, stats in traced.items():
+            functions[name]["allocated_bytes"] = stats["allocated_bytes"]
+    else:
+        for stats in functions.values():
+            stats["allocated_bytes"] = None
+
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(name, result):
+    print("{}: {} ticks in {:.2f}s ({:.0f} ticks/s)".format(
+        name, result["ticks"], result["seconds"],
+        result["ticks_per_second"]))
+
+    for function, stats in result["functions"].items():
+        if stats["calls"] == 0:
+            continue
+
+        allocated = ""
+        if stats["allocated_bytes"] is not None:
+            allocated = ", {:.1f} KiB allocated".format(
+                stats["allocated_bytes"] / 1024)
+
+        print("    {:<22} {:>9} calls {:>9.1f} ms{}".format(
+            function, stats["calls"], stats["seconds"] * 1000, allocated))
+
+
+def compare(results, baseline, tolerance):
+    regressions = 0
+
+    print("Comparison with baseline from commit",
+          baseline.get("commit"))
+
+    for name, result in results.items():
+        if name not in baseline["scenarios"]:
+            continue
+
+        old = baseline["scenarios"][name]["ticks_per_second"]
+        ratio = result["ticks_per_second"] / old if old else 0
+        regressed = ratio < 1 - tolerance
+        regressions += regressed
+
+        print("    {:<22} {:>9.0f} -> {:>9.0f} ticks/s ({:+.1f}%){}".format(
+            name, old, result["ticks_per_second"], (ratio - 1) * 100,
+            "  REGRESSION" if regressed else ""))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark simulation hot paths")
+    parser.add_argument("--scenario", action="append",
+                        help="run only given scenario, can be repeated")
+    parser.add_argument("--quick", action="store_true",
+                        help="smaller scenarios for a fast check")
+    parser.add_argument("--no-allocations", action="store_true",
+                        help="skip tracemalloc run")
+    parser.add_argument("--save", metavar="PATH",
+                        help="save results as JSON baseline")
+    parser.add_argument("--compare", metavar="PATH",
+                        help="compare ticks/s with JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="allowed slowdown before reporting regression")
+    parser.add_argument("--snapshot", type=int, metavar="ENTITIES",
+                        help="measure snapshot save and load instead")
+    args = parser.parse_args()
+
+    resource_manager = headless.init_display()
+
+    if args.snapshot is not None:
+        result = snapshot_benchmark(resource_manager, args.snapshot,
+                                    "benchmark_snapshot.npz")
+        print("Snapshot of {entities} entities, {bytes} bytes".format(
+            **result))
+        print("    capture {:.1f} ms (frame stall), write {:.1f} ms, "
+              "load {:.1f} ms, restore {:.1f} ms".format(
+                  result["capture"] * 1000, result["write"] * 1000,
+                  result["load"] * 1000, result["restore"] * 1000))
+        return
+
+    scenarios = make_scenarios(resource_manager, args.quick)
+
+    names = args.scenario or list(scenarios)
+    for name in names:
+        if name not in scenarios:
+            parser.error("unknown scenario " + repr(name))
+
+    results = {}
+    for name in names:
+        results[name] = run_scenario(*scenarios[name],
+                                     not args.no_allocations)
+        print_result(name, results[name])
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pygame": pg.version.ver,
+        "quick": args.quick,
+        "scenarios": results,
+    }
+
+    if args.save:
+        with open(args.save, "w") as json_file:
+            json.dump(report, json_file, indent=4)
+        print("[INFO] Baseline saved to", args.save)
+
+    if args.compare:
+        with open(args.compare, "r") as json_file:
+            baseline = json.load(json_file)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ for creating, drawing, using buttons.
 """
 
 import pygame as pg
+from textcache import text_cache
 
 
 class Button:
@@ -13,6 +14,16 @@ class Button:
 
     """
 
+    FONT = ("resources/arial.ttf", 20)
+
+    __slots__ = ("button_surface", "screen", "bg_color", "fg_color",
+                 "texture", "rect", "on", "clicked", "active", "caption",
+                 "text_surface", "text_rect", "command", "args")
+
+    @staticmethod
+    def init(resource_manager):
+        Button.resource_manager = resource_manager
+
     def __init__(self, screen, rect, texture=None, caption="",
                  fg_color=(255, 255, 255, 0), bg_color=(0, 0, 0, 0),
                  command=lambda: 0, args=[], split=True):
@@ -35,13 +46,11 @@ class Button:
         self.active = True
         self.caption = caption
 
-        self.BASICFONT = pg.font.Font("resources/arial.ttf", 20)
-
-        self.text_surface = self.BASICFONT.render(caption, True, fg_color)
+        self.text_surface = text_cache.render(
+            Button.resource_manager.get_font(*Button.FONT), caption, fg_color)
         self.text_rect = self.text_surface.get_rect(center=(rect.width/2,
                                                     rect.height/2))
         self.command = command
-        self.screen = screen
         self.args = args
 
     def draw(self):
@@ -74,6 +83,17 @@ class Button:
                 if self.rect.collidepoint(pg.mouse.get_pos()):
                     self.clicked = 1
 
+    def set_caption(self, caption):
+        if caption == self.caption:
+            return
+
+        self.caption = caption
+        self.text_surface = text_cache.render(
+            Button.resource_manager.get_font(*Button.FONT), caption,
+            self.fg_color)
+        self.text_rect = self.text_surface.get_rect(
+            center=(self.rect.width/2, self.rect.height/2))
+
     def toggle_active(self):
         self.active ^= 1
 
@@ -0,0 +1,102 @@
+"""
+
+This module contains class Camera which is responsible for choosing part
+of the level shown in the map area of the screen and turning positions
+between world and screen
+
+"""
+
+from math import floor, ceil
+
+from pygame import Rect
+
+
+class Camera:
+    """
+
+    World point at the top left corner of the viewport and zoom level.
+    Zoom goes through fixed levels whose tile size is whole number of
+    pixels, so scaled textures and map chunks are cached per level.
+
+    """
+
+    ZOOM_LEVELS = (0.25, 0.5, 0.75, 1, 1.25, 1.5, 2)
+
+    def __init__(self, viewport, world_size):
+        self.viewport = Rect(viewport)
+        self.world_size = world_size
+        self.zoom_level = Camera.ZOOM_LEVELS.index(1)
+        self.x = 0
+        self.y = 0
+
+    @property
+    def zoom(self):
+        return Camera.ZOOM_LEVELS[self.zoom_level]
+
+    # changes whenever anything drawn through camera moves
+    def state(self):
+        return self.origin() + (self.zoom_level,)
+
+    # screen position of world point (0, 0), whole pixels so map chunks
+    # and sprites move together
+    def origin(self):
+        return (self.viewport.x - round(self.x * self.zoom),
+                self.viewport.y - round(self.y * self.zoom))
+
+    # map smaller than viewport stays in its top left corner
+    def clamp(self):
+        width = self.viewport.w / self.zoom
+        height = self.viewport.h / self.zoom
+
+        self.x = min(max(self.x, 0), max(self.world_size[0] - width, 0))
+        self.y = min(max(self.y, 0), max(self.world_size[1] - height, 0))
+
+    # distance is given in screen pixels
+    def pan(self, dx, dy):
+        self.x += dx / self.zoom
+        self.y += dy / self.zoom
+        self.clamp()
+
+    # world point under given screen point stays in place
+    def zoom_at(self, steps, point):
+        zoom_level = min(max(self.zoom_level + steps, 0),
+                         len(Camera.ZOOM_LEVELS) - 1)
+        if zoom_level == self.zoom_level:
+            return
+
+        world_x, world_y = self.to_world(point)
+        self.zoom_level = zoom_level
+        self.x = world_x - (point[0] - self.viewport.x) / self.zoom
+        self.y = world_y - (point[1] - self.viewport.y) / self.zoom
+        self.clamp()
+
+    def to_world(self, point):
+        origin = self.origin()
+        return ((point[0] - origin[0]) / self.zoom,
+                (point[1] - origin[1]) / self.zoom)
+
+    def to_screen(self, point):
+        origin = self.origin()
+        return (point[0] * self.zoom + origin[0],
+                point[1] * self.zoom + origin[1])
+
+    # points in form of NumPy array of (x, y) rows
+    def to_screen_array(self, points):
+        return points * self.zoom + self.origin()
+
+    # part of the world shown in viewport
+    def visible_rect(self):
+        left, top = self.to_world(self.viewport.topleft)
+        right, bottom = self.to_world(self.viewport.bottomright)
+
+        return Rect(floor(left), floor(top), ceil(right) - floor(left),
+                    ceil(bottom) - floor(top))
+
+    # mask of points closer than margin to visible part of the world
+    def visible(self, points, margin):
+        rect = self.visible_rect()
+        x = points[:, 0]
+        y = points[:, 1]
+
+        return ((x > rect.left - margin) & (x < rect.right + margin) &
+                (y > rect.top - margin) & (y < rect.bottom + margin))
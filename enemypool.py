@@ -0,0 +1,169 @@
+"""
+
+This module contains class EnemyPool which is responsible for
+storing enemy state in NumPy arrays and moving all enemies along
+their level routes, or along a flow field in mazing mode, at once
+
+"""
+
+import numpy as np
+
+from slotpool import SlotPool
+
+
+class EnemyPool(SlotPool):
+    """
+
+    Structure of arrays, one slot per enemy. Slots are reused after
+    release, generation tells views that their slot was taken over.
+
+    """
+
+    FIELDS = (("hp", np.int64, 0),
+              ("speed", np.float64, 0),
+              ("value", np.int64, 0),
+              ("enemy_type", np.int64, 0),
+              # route and distance travelled along it
+              ("route", np.int64, 0),
+              ("distance", np.float64, 0),
+              ("position", np.float64, 2),
+              # center of the next tile when following flow field
+              ("waypoint", np.float64, 2),
+              ("previous_position", np.float64, 2),
+              ("active", bool, 0),
+              ("alive", bool, 0),
+              ("finished", bool, 0),
+              ("used", bool, 0),
+              ("generation", np.int64, 0))
+
+    # waypoints an enemy can pass in a single update
+    MAX_WAYPOINTS = 8
+
+    def __init__(self, path_table, half_size, capacity=256, flow_field=None):
+        self.half_size = half_size
+        self.path_table = path_table
+        self.flow_field = flow_field
+
+        super().__init__(capacity)
+
+    def spawn(self, rect_topleft, enemy_type, hp, speed, value, route=0):
+        idx = self.allocate()
+
+        self.hp[idx] = hp
+        self.speed[idx] = speed
+        self.value[idx] = value
+        self.enemy_type[idx] = enemy_type
+        self.route[idx] = route
+        self.distance[idx] = 0
+        self.position[idx] = (rect_topleft[0] + self.half_size,
+                              rect_topleft[1] + self.half_size)
+        self.previous_position[idx] = self.position[idx]
+        self.waypoint[idx] = self.position[idx]
+        self.active[idx] = True
+        self.alive[idx] = True
+        self.finished[idx] = False
+        self.used[idx] = False
+
+        return idx
+
+    def release(self, idx):
+        self.active[idx] = False
+        self.alive[idx] = False
+        self.generation[idx] += 1
+        self.free_slots([idx])
+
+    def count_alive(self):
+        return int(np.count_nonzero(self.alive))
+
+    # marks dead and finished enemies as used,
+    # returns bounty for killed enemies and number of finished ones
+    def settle(self):
+        pending = self.active & ~self.alive & ~self.used
+        killed = pending & ~self.finished
+        leaked = pending & self.finished
+
+        self.used |= pending
+
+        return int(self.value[killed].sum()), int(np.count_nonzero(leaked))
+
+    # distance left to the end, along route or through flow field
+    def remaining_distance(self, idx):
+        if self.flow_field is None:
+            return (self.path_table.lengths[self.route[idx]] -
+                    self.distance[idx])
+
+        tile_size = 2 * self.half_size
+        x, y = (self.waypoint[idx] // tile_size).astype(np.int64)
+        offset = self.waypoint[idx] - self.position[idx]
+
+        return (self.flow_field.distance[y, x] * tile_size +
+                np.hypot(offset[0], offset[1]))
+
+    def update(self, dt):
+        self.previous_position[:] = self.position
+
+        dying = self.alive & (self.hp <= 0)
+        self.alive &= ~dying
+
+        idx = np.flatnonzero(self.alive)
+
+        if idx.size == 0:
+            return
+
+        if self.flow_field is not None:
+            self.follow_flow_field(idx, dt)
+            return
+
+        route = self.route[idx]
+        distance = self.distance[idx] + dt * self.speed[idx]
+        self.distance[idx] = distance
+
+        done = idx[distance > self.path_table.lengths[route]]
+        self.alive[done] = False
+        self.finished[done] = True
+
+        self.position[idx] = self.path_table.positions(distance, route)
+
+    # enemies walk from tile center to tile center, next tile is chosen
+    # from flow field when waypoint is reached
+    def follow_flow_field(self, idx, dt):
+        field = self.flow_field
+        tile_size = 2 * self.half_size
+
+        left_distance = dt * self.speed[idx]
+        self.distance[idx] += left_distance
+
+        position = self.position[idx]
+        waypoint = self.waypoint[idx]
+        finished = np.zeros(idx.size, dtype=bool)
+
+        for _ in range(EnemyPool.MAX_WAYPOINTS):
+            offset = waypoint - position
+            length = np.hypot(offset[:, 0], offset[:, 1])
+            step = np.minimum(left_distance, length)
+
+            moving = length > 0
+            position[moving] += (offset[moving] *
+                                 (step[moving] / length[moving])[:, None])
+            left_distance -= step
+
+            reached = np.flatnonzero(~finished & (step == length))
+            tiles = (waypoint[reached] // tile_size).astype(np.int64)
+
+            at_end = field.distance[tiles[:, 1], tiles[:, 0]] == 0
+            finished[reached[at_end]] = True
+            left_distance[finished] = 0
+
+            going = reached[~at_end]
+            next_tiles = field.next_tile[tiles[~at_end, 1], tiles[~at_end, 0]]
+            waypoint[going] = next_tiles * tile_size + self.half_size
+
+            if not (left_distance > 0).any():
+                break
+
+        self.position[idx] = position
+        self.waypoint[idx] = waypoint
+
+        done = idx[finished]
+        self.alive[done] = False
+        self.finished[done] = True
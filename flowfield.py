@@ -0,0 +1,199 @@
+"""
+
+This module contains class FlowField which is responsible for keeping
+distance to the goal for every map tile, so enemies can walk around
+turrets placed on open tiles without searching a path each
+
+"""
+
+from collections import deque
+import heapq
+
+import numpy as np
+
+
+class FlowField:
+    """
+
+    Distance-to-goal grid with the next tile to step on for every tile.
+    Blocking or unblocking a tile recomputes only the region whose
+    distance can change.
+
+    """
+
+    MOVES = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+    UNREACHABLE = np.iinfo(np.int32).max
+
+    ARRAYS = ("movable", "distance", "next_tile")
+
+    # data is a snapshot of the field made for the same map, it is
+    # used instead of searching distances again
+    def __init__(self, tile_map, end_tiles, movable_tiles, data=None):
+        self.rows = len(tile_map)
+        self.columns = len(tile_map[0])
+        self.end_tiles = list(end_tiles)
+
+        # number of tiles recomputed by the last change
+        self.updated = 0
+
+        if data is not None:
+            self.restore(data)
+            return
+
+        self.movable = np.array([[tile in movable_tiles for tile in row]
+                                 for row in tile_map], dtype=bool)
+        self.distance = np.full((self.rows, self.columns),
+                                FlowField.UNREACHABLE, dtype=np.int32)
+        # next tile in form of (x, y), unreachable tiles point at themselves
+        self.next_tile = np.stack(np.meshgrid(np.arange(self.columns),
+                                              np.arange(self.rows)), axis=-1)
+
+        for x, y in self.end_tiles:
+            self.distance[y, x] = 0
+
+        self.relax(deque(self.end_tiles))
+        self.update_next(zip(*np.nonzero(self.movable.T)))
+
+    def snapshot(self):
+        return {name: getattr(self, name).copy() for name in FlowField.ARRAYS}
+
+    def restore(self, data):
+        for name in FlowField.ARRAYS:
+            setattr(self, name, data[name].copy())
+
+    def neighbours(self, tile):
+        for dx, dy in FlowField.MOVES:
+            nx = tile[0] + dx
+            ny = tile[1] + dy
+
+            if (0 <= nx < self.columns and 0 <= ny < self.rows and
+                    self.movable[ny, nx]):
+                yield nx, ny
+
+    def reachable(self, tile):
+        return bool(self.distance[tile[1], tile[0]] != FlowField.UNREACHABLE)
+
+    # breadth first search from tiles with already known distance
+    def relax(self, queue):
+        distance = self.distance
+
+        while queue:
+            tile = queue.popleft()
+            next_distance = distance[tile[1], tile[0]] + 1
+
+            for nx, ny in self.neighbours(tile):
+                if next_distance < distance[ny, nx]:
+                    distance[ny, nx] = next_distance
+                    queue.append((nx, ny))
+
+    # dijkstra limited to given region, seeds are (distance, tile),
+    # returns tiles whose distance went down
+    def relax_region(self, seeds, region):
+        distance = self.distance
+        changed = set()
+        heapq.heapify(seeds)
+
+        while seeds:
+            tile_distance, tile = heapq.heappop(seeds)
+
+            if tile_distance >= distance[tile[1], tile[0]]:
+                continue
+
+            distance[tile[1], tile[0]] = tile_distance
+            changed.add(tile)
+
+            for next_tile in self.neighbours(tile):
+                if region is None or next_tile in region:
+                    heapq.heappush(seeds, (tile_distance + 1, next_tile))
+
+        return changed
+
+    def update_next(self, tiles):
+        distance = self.distance
+
+        for x, y in tiles:
+            best = (x, y)
+            best_distance = distance[y, x]
+
+            # blocked tiles point at themselves like unreachable ones
+            if not self.movable[y, x]:
+                self.next_tile[y, x] = best
+                continue
+
+            # ties go to the first move so result does not depend on order
+            for nx, ny in self.neighbours((x, y)):
+                if distance[ny, nx] < best_distance:
+                    best = (nx, ny)
+                    best_distance = distance[ny, nx]
+
+            self.next_tile[y, x] = best
+
+    # tiles which reach the goal only through blocked tile
+    def dependent_tiles(self, tile):
+        distance = self.distance
+        affected = {tile}
+        level = [tile]
+
+        while level:
+            candidates = set()
+            for x, y in level:
+                for nx, ny in self.neighbours((x, y)):
+                    if distance[ny, nx] == distance[y, x] + 1:
+                        candidates.add((nx, ny))
+
+            # whole previous level is known before candidates are checked
+            level = [candidate for candidate in sorted(candidates)
+                     if not any(distance[py, px] ==
+                                distance[candidate[1], candidate[0]] - 1 and
+                                (px, py) not in affected
+                                for px, py in self.neighbours(candidate))]
+            affected.update(level)
+
+        return affected
+
+    def block(self, tile):
+        x, y = tile
+        reachable = self.reachable(tile)
+        affected = self.dependent_tiles(tile) if reachable else {tile}
+
+        self.movable[y, x] = False
+
+        for ax, ay in affected:
+            self.distance[ay, ax] = FlowField.UNREACHABLE
+
+        # affected region is filled again from its border
+        seeds = []
+        for affected_tile in affected:
+            if affected_tile == tile:
+                continue
+            for nx, ny in self.neighbours(affected_tile):
+                if (nx, ny) not in affected and self.reachable((nx, ny)):
+                    seeds.append((int(self.distance[ny, nx]) + 1,
+                                  affected_tile))
+
+        self.relax_region(seeds, affected)
+        self.finish_update(affected)
+
+    def unblock(self, tile):
+        x, y = tile
+        self.movable[y, x] = True
+
+        if tile in self.end_tiles:
+            seeds = [(0, tile)]
+        else:
+            seeds = [(int(self.distance[ny, nx]) + 1, tile)
+                     for nx, ny in self.neighbours(tile)
+                     if self.reachable((nx, ny))]
+
+        # distances only go down, wave stops where nothing improves
+        affected = self.relax_region(seeds, None)
+        affected.add(tile)
+        self.finish_update(affected)
+
+    def finish_update(self, affected):
+        border = set(affected)
+        for tile in affected:
+            border.update(self.neighbours(tile))
+
+        self.update_next(border)
+        self.updated = len(affected)
@@ -0,0 +1,97 @@
+"""
+
+This module contains check of FlowField incremental updates which
+blocks and unblocks random tiles of random grids and compares the field
+with one built from scratch after every change. Exit status is 1 when
+any field differs
+
+Usage:
+python3 flowfieldcheck.py --grids 200 --seed 0
+
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+from flowfield import FlowField
+
+# tile map values, 0 is not movable
+PATH_TILE = 3
+END_TILE = 4
+MOVABLE_TILES = {PATH_TILE, END_TILE}
+
+
+def random_grid(random):
+    columns, rows = random.randint(2, 20, size=2)
+    tile_map = np.where(random.random_sample((rows, columns)) < 0.3,
+                        0, PATH_TILE).tolist()
+    end_tiles = sorted({(int(random.randint(columns)),
+                         int(random.randint(rows)))
+                        for _ in range(random.randint(1, 3))})
+
+    for x, y in end_tiles:
+        tile_map[y][x] = END_TILE
+
+    return tile_map, end_tiles
+
+
+# returns number of changes after which the field differed
+def check_grid(random, grid, changes):
+    tile_map, end_tiles = random_grid(random)
+    rows, columns = len(tile_map), len(tile_map[0])
+    field = FlowField(tile_map, end_tiles, MOVABLE_TILES)
+    mismatches = 0
+
+    for change in range(changes):
+        x, y = int(random.randint(columns)), int(random.randint(rows))
+        if (x, y) in end_tiles:
+            continue
+
+        if field.movable[y, x]:
+            field.block((x, y))
+            tile_map[y][x] = 0
+        else:
+            field.unblock((x, y))
+            tile_map[y][x] = PATH_TILE
+
+        fresh = FlowField(tile_map, end_tiles, MOVABLE_TILES)
+        different = [name for name in FlowField.ARRAYS
+                     if not np.array_equal(getattr(field, name),
+                                           getattr(fresh, name))]
+
+        if different:
+            print("[INFO] Grid {} differs after change {} at {} in {}"
+                  .format(grid, change, (x, y), ", ".join(different)))
+            mismatches += 1
+            field = fresh
+
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare incremental flow field updates with fields "
+                    "built from scratch")
+    parser.add_argument("--grids", type=int, default=200,
+                        help="number of random grids")
+    parser.add_argument("--changes", type=int, default=50,
+                        help="blocked or unblocked tiles per grid")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of random grids")
+    args = parser.parse_args()
+
+    random = np.random.RandomState(args.seed)
+    mismatches = sum(check_grid(random, grid, args.changes)
+                     for grid in range(args.grids))
+
+    print("[INFO] Flow field checked on", args.grids, "random grids,",
+          mismatches, "mismatches")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
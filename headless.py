@@ -0,0 +1,197 @@
+"""
+
+This module contains headless runner which simulates a level with
+scripted turret placement plan at maximum speed, without display
+or fonts, and prints outcome of the run
+
+Usage:
+python3 headless.py "LEVEL 1" --plan plan.json
+python3 headless.py --replay replay.tdr --max-ticks 3000
+
+Plan is a JSON list of actions applied at given simulation tick:
+    {"tick": 0, "action": "place", "tile_id": 3, "turret_type": 1}
+    {"tick": 600, "action": "upgrade", "tile_id": 3}
+    {"tick": 700, "action": "target", "tile_id": 3, "mode": "first"}
+    {"tick": 900, "action": "sell", "tile_id": 3}
+
+"""
+
+import argparse
+import json
+import os
+import time
+
+import pygame as pg
+from pygame.surface import Surface
+
+import resourcemanager
+from button import Button
+from levelstate import Level, LevelState, Turret
+from replay import Replay
+from statemachine import StateMachine
+
+
+def load_plan(path):
+    if path is None:
+        return []
+
+    with open(path, "r") as json_file:
+        plan = json.load(json_file)
+
+    return sorted(plan, key=lambda action: action.get("tick", 0))
+
+
+def apply_action(level, action):
+    try:
+        apply_plan_action(level, action)
+    except (KeyError, ValueError) as error:
+        raise ValueError("Invalid plan action {}: {!r}".format(
+            json.dumps(action), error))
+
+
+def apply_plan_action(level, action):
+    kind = action["action"]
+
+    if kind == "place":
+        level.place_turret(action["tile_id"], action["turret_type"])
+        return
+
+    turret = level.get_turret(action["tile_id"])
+    if turret is None:
+        return
+
+    if kind == "upgrade":
+        level.upgrade_turret(turret)
+    elif kind == "sell":
+        level.sell_turret(turret)
+    elif kind == "target":
+        level.set_targeting(turret,
+                            Turret.TARGETING_MODES.index(action["mode"]))
+    else:
+        raise ValueError("Unknown plan action: " + str(kind))
+
+
+# applies plan actions due at current tick, returns index of the next
+# action waiting
+def apply_due_actions(level, plan, next_action):
+    while (next_action < len(plan) and
+           plan[next_action].get("tick", 0) <= level.tick):
+        apply_action(level, plan[next_action])
+        next_action += 1
+
+    return next_action
+
+
+# display without window, fonts and textures for tools which draw
+# levels, returns resource manager
+def init_display():
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pg.display.init()
+    pg.font.init()
+    pg.display.set_mode(StateMachine.SCREEN_SIZE)
+
+    resource_manager = resourcemanager.ResourceManager()
+    Button.init(resource_manager)
+
+    return resource_manager
+
+
+# level state drawing on its own surface, display has to be initialized
+def make_level_state(resource_manager, level_name):
+    state = LevelState(Surface(StateMachine.SCREEN_SIZE), resource_manager)
+    state.startup(Surface(StateMachine.SCREEN_SIZE), level_name)
+
+    return state
+
+
+def run_level(resource_manager, level_name, plan, max_ticks=None,
+              verbose=False):
+    level = Level(resource_manager, level_name, verbose)
+
+    next_action = 0
+    start = time.perf_counter()
+
+    while level.finished is False:
+        if max_ticks is not None and level.tick >= max_ticks:
+            break
+
+        next_action = apply_due_actions(level, plan, next_action)
+        level.step(Level.TICK)
+
+    return level_stats(level, level_name, time.perf_counter() - start)
+
+
+# plays recorded actions, used to reproduce reported games
+def run_replay(resource_manager, replay, max_ticks=None, verbose=False):
+    level = Level(resource_manager, replay.level_name, verbose)
+
+    start = time.perf_counter()
+    replay.play(level, max_ticks)
+
+    return level_stats(level, replay.level_name, time.perf_counter() - start)
+
+
+def level_stats(level, level_name, elapsed):
+    if level.won:
+        result = "won"
+        waves_survived = level.current_wave
+    else:
+        result = "lost" if level.finished else "unfinished"
+        waves_survived = max(level.current_wave - 1, 0)
+
+    return {
+        "level": level_name,
+        "result": result,
+        "waves_survived": waves_survived,
+        "max_wave": level.max_wave,
+        "money": level.money,
+        "health": level.health,
+        "turrets": len(level.turrets),
+        "ticks": level.tick,
+        "seconds": elapsed,
+        "ticks_per_second": level.tick / elapsed if elapsed > 0 else 0,
+    }
+
+
+def print_stats(stats):
+    print("[INFO] {level}: {result}, waves survived {waves_survived}/"
+          "{max_wave}, money {money}, health {health}, turrets {turrets}"
+          .format(**stats))
+    print("[INFO] {ticks} ticks in {seconds:.3f}s "
+          "({ticks_per_second:.0f} ticks/s)".format(**stats))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulate a level without display")
+    parser.add_argument("level", nargs="?",
+                        help="level name from level_data.json")
+    parser.add_argument("--plan", help="JSON file with turret actions")
+    parser.add_argument("--replay", help="replay file recorded by main.py")
+    parser.add_argument("--max-ticks", type=int, default=None,
+                        help="stop simulation after this many ticks")
+    parser.add_argument("--json", action="store_true",
+                        help="print stats as a single JSON line")
+    parser.add_argument("--verbose", action="store_true",
+                        help="print entities reclaimed after every wave")
+    args = parser.parse_args()
+
+    resource_manager = resourcemanager.ResourceManager(load_textures=False)
+
+    if args.replay is not None:
+        stats = run_replay(resource_manager, Replay.load(args.replay),
+                           args.max_ticks, args.verbose)
+    elif args.level not in resource_manager.level_data:
+        parser.error("unknown level " + repr(args.level))
+    else:
+        stats = run_level(resource_manager, args.level,
+                          load_plan(args.plan), args.max_ticks, args.verbose)
+
+    if args.json:
+        print(json.dumps(stats))
+    else:
+        print_stats(stats)
+
+
+if __name__ == "__main__":
+    main()
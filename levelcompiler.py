@@ -0,0 +1,103 @@
+"""
+
+This module contains functions which are responsible for storing
+everything derived from a level map in one compiled file, so entering
+a level is a single read instead of searching routes again
+
+Compiled level is a NumPy .npz archive with build slots, spawn and end
+tiles, route segments and flow field of mazing levels. It is stored with
+hash of the map JSON and made again when the map changes. VERSION has
+to be bumped whenever layout of the arrays or the way they are derived
+changes.
+
+"""
+
+import hashlib
+import json
+import os
+import re
+import zipfile
+
+import numpy as np
+
+VERSION = 1
+CACHE_DIR = "resources/cache"
+
+# arrays every compiled level has
+ARRAYS = ("key", "slots", "spawn_tiles", "end_tiles", "route_spawns",
+          "route_offsets", "segments")
+
+
+# settings are constants of Level which change derived data
+def source_key(tile_map, mazing, settings):
+    text = json.dumps([VERSION, tile_map, mazing, settings])
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+# compiled map key together with level data, snapshots are restored
+# only on the same version of a level
+def level_key(compiled, level_data):
+    text = json.dumps([str(compiled["key"]), level_data], sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def cache_path(level_name):
+    name = re.sub("[^0-9a-z]+", "_", level_name.lower()).strip("_")
+    return os.path.join(CACHE_DIR, "level_" + name + ".npz")
+
+
+# routes in form of (spawn id, paths) are stored as spawn id of every
+# route, offsets of its segments and segments in form of
+# (dx, dy, length, end x, end y)
+def pack_routes(routes):
+    offsets = [0]
+    segments = []
+
+    for _, paths in routes:
+        segments.extend((direction[0], direction[1], length, end[0], end[1])
+                        for direction, length, end in paths)
+        offsets.append(len(segments))
+
+    return {"route_spawns": np.array([spawn_id for spawn_id, _ in routes],
+                                     dtype=np.int32),
+            "route_offsets": np.array(offsets, dtype=np.int32),
+            "segments": np.array(segments, dtype=np.int32).reshape(-1, 5)}
+
+
+def unpack_routes(data):
+    segments = [((dx, dy), length, (x, y)) for dx, dy, length, x, y
+                in data["segments"].tolist()]
+    offsets = data["route_offsets"].tolist()
+
+    return [(spawn_id, segments[start:end]) for spawn_id, start, end
+            in zip(data["route_spawns"].tolist(), offsets, offsets[1:])]
+
+
+def save(data, level_name):
+    path = cache_path(level_name)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    # processes of a parameter sweep can compile the same level at once
+    temporary_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary_path, "wb") as level_file:
+        np.savez(level_file, **data)
+
+    os.replace(temporary_path, path)
+
+
+# returns arrays of compiled level or None when it is missing, stale,
+# corrupt or lacks any of ARRAYS and given extra arrays
+def load(level_name, key, extra=()):
+    try:
+        with np.load(cache_path(level_name), allow_pickle=False) as archive:
+            data = dict(archive)
+    except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+        return None
+
+    if str(data.get("key")) != key:
+        return None
+
+    if any(name not in data for name in ARRAYS + tuple(extra)):
+        return None
+
+    return data
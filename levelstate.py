@@ -5,8 +5,9 @@ This module contains classes:
     Enemy which is resposible for drawing, managing enemies,
     Projectile which is resposible for drawing, managing projectiles,
     EnemySpawner which is resposible for creating new enemies,
-    LevelState which is responsible for drawing UI, game logic and
-    managing turrets, enemies, projectiles
+    Level which is responsible for game logic and managing turrets,
+    enemies, projectiles without drawing anything,
+    LevelState which is responsible for drawing UI and running Level
 
 """
 
@@ -16,84 +17,724 @@ from pygame import Rect
 from pygame.surface import Surface
 import pygame.locals as pgl
 from pygame.draw import circle
+import pygame as pg
 from math import sqrt
-from pygame.math import Vector2
-from pygame import font
+from collections import deque
+import heapq
 from button import Button
+from camera import Camera
+from mapchunks import MapChunks
+from spatialhash import SpatialHash
+from enemypool import EnemyPool
+from pathtable import PathTable
+from flowfield import FlowField
+from projectilepool import ProjectilePool
+from textcache import text_cache
+from profiler import frame_profiler
+from replay import Replay
+from waveschedule import WaveSchedule
+import levelcompiler
+import snapshot
+import numpy as np
+
+
+class Level:
+    """
+
+    Simulation of a single level, it does not touch display, fonts
+    or textures so it can also run headless.
+
+    """
+
+    MOVABLE_TILES = [1, 3, 4]
+    TILE_SIZE = 64
+
+    MOVES = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+
+    # limits of route search on maps with forks and loops
+    MAX_ROUTES = 8
+    MAX_EXPANSIONS = 10000
+
+    # compiled levels of already loaded maps keyed by source key
+    compiled_levels = {}
+
+    SNAPSHOT_SCALARS = ("tick", "money", "health", "current_wave",
+                        "next_wave_time", "max_wave", "alive_enemies",
+                        "finished", "won", "reclaimed_enemies",
+                        "reclaimed_projectiles")
+
+    # simulation always advances in steps of TICK seconds,
+    # speed multiplier changes number of steps per second
+    TICK_RATE = 60
+    TICK = 1 / TICK_RATE
+
+    # verbose prints entities reclaimed in every wave
+    def __init__(self, resource_manager, level_name, verbose=False):
+        self.level_name = level_name
+        self.level_data = resource_manager.level_data[level_name]
+        self.tile_map = resource_manager.maps[level_name]
+        self.verbose = verbose
+
+        # in mazing mode turrets can be placed on path tiles
+        self.mazing = self.level_data.get("mazing", False)
+        self.flow_field = None
+
+        self.tiles, self.spawn_points, self.routes = self.prepare_map()
+        self.slot_ids = {self.tile_of(rect.topleft): tile_id
+                         for tile_id, (rect, _) in enumerate(self.tiles)}
+        self.path_table = PathTable(
+            [(self.spawn_points[spawn_id], paths)
+             for spawn_id, paths in self.routes], Level.TILE_SIZE // 2)
+
+        # route ids which start at each spawn point
+        self.spawn_routes = [[] for _ in self.spawn_points]
+        for route_id, (spawn_id, _) in enumerate(self.routes):
+            self.spawn_routes[spawn_id].append(route_id)
+
+        self.enemy_grid = SpatialHash(Level.TILE_SIZE, len(self.tile_map[0]),
+                                      len(self.tile_map))
+
+        self.enemies = []
+        self.turrets = []
+
+        self.enemy_pool = EnemyPool(self.path_table, Level.TILE_SIZE // 2,
+                                    flow_field=self.flow_field)
+        self.projectiles = ProjectilePool(self.enemy_pool)
+
+        Turret.init(self.turrets, self.enemies, self.enemy_grid)
+        Projectile.init(self.projectiles)
+        Enemy.init(self.enemy_pool)
+
+        self.max_wave = self.level_data["waves"]
+        self.health = self.level_data["health"]
+        self.money = self.level_data["start_money"]
+
+        self.next_wave_time = 0
+        self.current_wave = 0
+        self.tick = 0
+        self.alive_enemies = 0
+        self.finished = False
+        self.won = False
+
+        self.reclaimed_enemies = 0
+        self.reclaimed_projectiles = 0
+        self.reclaimed_per_wave = []
+
+        # level replaces keys of the default schedule
+        schedule = dict(resource_manager.wave_schedule)
+        schedule.update(self.level_data.get("schedule", {}))
+
+        try:
+            self.schedule = WaveSchedule(schedule, self.max_wave,
+                                         len(Enemy.BASE_STATS),
+                                         len(self.spawn_points))
+        except ValueError as error:
+            raise ValueError("{} in {}".format(error, level_name))
+
+        self.level_key = levelcompiler.level_key(
+            self.compiled, dict(self.level_data, schedule=schedule))
+
+        self.enemy_spawner = EnemySpawner(self.enemies, self.spawn_points,
+                                          self.spawn_routes, self.schedule)
+
+    # advances simulation by one fixed tick
+    def step(self, dt=TICK):
+        if self.finished:
+            return
+
+        self.tick += 1
+        self.next_wave_time -= dt
+
+        if self.next_wave_time <= 0 and self.current_wave < self.max_wave:
+            self.report_reclaimed()
+            self.current_wave += 1
+            self.next_wave_time += self.schedule.interval(self.current_wave)
+            self.enemy_spawner.spawn_wave(self.current_wave)
+
+        frame_profiler.start("turrets")
+        # enemies do not move while turrets are looking for targets
+        self.enemy_grid.rebuild(self.enemies, self.enemy_pool)
+
+        for turret in self.turrets:
+            turret.update(dt)
+        frame_profiler.stop("turrets")
+
+        frame_profiler.start("projectiles")
+        self.reclaimed_projectiles += self.projectiles.update(dt)
+        frame_profiler.stop("projectiles")
+
+        frame_profiler.start("spawner")
+        self.enemy_spawner.update(dt)
+        frame_profiler.stop("spawner")
+
+        frame_profiler.start("enemies")
+        self.alive_enemies = self.enemy_pool.count_alive()
+
+        bounty, leaked = self.enemy_pool.settle()
+        self.money += bounty
+        self.health -= leaked
+
+        self.enemy_pool.update(dt)
+
+        self.sweep()
+        frame_profiler.stop("enemies")
+
+        # LEVEL WON
+        if (self.alive_enemies == 0 and self.current_wave == self.max_wave and
+                self.enemy_spawner.pending() == 0):
+            self.won = True
+            self.finish()
+
+        # LEVEL LOST
+        elif self.health <= 0:
+            self.finish()
+
+    def finish(self):
+        self.report_reclaimed()
+        self.finished = True
+
+    # ids come from plans and replays as well, unknown ones raise
+    # ValueError
+    def place_turret(self, tile_id, turret_type):
+        if not (isinstance(tile_id, int) and
+                0 <= tile_id < len(self.tiles)):
+            raise ValueError("Unknown build tile " + repr(tile_id))
+
+        if not (isinstance(turret_type, int) and
+                0 <= turret_type < len(Turret.BASE_STATS)):
+            raise ValueError("Unknown turret type " + repr(turret_type))
+
+        rect, available = self.tiles[tile_id]
+
+        if (self.finished or available is False or
+                self.money < Turret.get_cost(turret_type)):
+            return None
+
+        if self.flow_field is not None and not self.block_tile(rect):
+            return None
+
+        turret = Turret.create_turret(rect.topleft, turret_type, tile_id)
+        self.turrets.append(turret)
+        self.tiles[tile_id][1] = False
+        self.money -= Turret.get_cost(turret_type)
+
+        return turret
+
+    def upgrade_turret(self, turret):
+        if self.money < turret.get_upgrade_cost():
+            return False
+
+        self.money -= turret.get_upgrade_cost()
+        turret.upgrade()
+
+        return True
+
+    # mode is index in Turret.TARGETING_MODES
+    def set_targeting(self, turret, mode):
+        turret.targeting = Turret.TARGETING_MODES[mode]
+        turret.current_target = None
+
+    def sell_turret(self, turret):
+        self.money += int(turret.used_money * 0.4)
+
+        self.tiles[turret.tile_id][1] = True
+
+        if self.flow_field is not None:
+            tile = self.tile_of(turret.texture_rect.topleft)
+            if self.tile_map[tile[1]][tile[0]] in Level.MOVABLE_TILES:
+                self.flow_field.unblock(tile)
+
+        del(self.turrets[self.turrets.index(turret)])
+
+    @staticmethod
+    def tile_of(point):
+        return (int(point[0] // Level.TILE_SIZE),
+                int(point[1] // Level.TILE_SIZE))
+
+    # id of build tile under world point or None
+    def tile_id_at(self, point):
+        return self.slot_ids.get(self.tile_of(point))
+
+    # blocks path tile under new turret, placement which would leave
+    # a spawn or an enemy without way to the end is undone
+    def block_tile(self, rect):
+        field = self.flow_field
+        tile = self.tile_of(rect.topleft)
+
+        if not field.movable[tile[1], tile[0]]:
+            return True
+
+        pool = self.enemy_pool
+        alive = np.flatnonzero(pool.alive)
+        occupied = {self.tile_of(point) for point in
+                    pool.position[alive].tolist() +
+                    pool.waypoint[alive].tolist()}
+
+        if tile in occupied:
+            return False
+
+        field.block(tile)
+
+        required = occupied | {self.tile_of(point)
+                               for point in self.spawn_points}
+        if all(field.reachable(required_tile) for required_tile in required):
+            return True
+
+        field.unblock(tile)
+        return False
+
+    def get_turret(self, tile_id):
+        for turret in self.turrets:
+            if turret.tile_id == tile_id:
+                return turret
+        return None
+
+    # whole simulation state as a dict of arrays
+    def snapshot(self):
+        data = {"level_name": np.array(self.level_name),
+                "level_key": np.array(self.level_key),
+                "tiles": np.array([available for _, available in self.tiles],
+                                  dtype=bool),
+                "reclaimed_per_wave": np.array(self.reclaimed_per_wave,
+                                               dtype=np.int64).reshape(-1, 3),
+                "enemies": np.array([enemy.index for enemy in self.enemies],
+                                    dtype=np.int64),
+                "turrets": np.array([turret.snapshot()
+                                     for turret in self.turrets],
+                                    dtype=np.float64).reshape(
+                                        -1, len(Turret.SNAPSHOT_FIELDS))}
+
+        for name in Level.SNAPSHOT_SCALARS:
+            data[name] = np.array(getattr(self, name))
+
+        for prefix, part in (("enemy_pool.", self.enemy_pool),
+                             ("projectiles.", self.projectiles),
+                             ("spawner.", self.enemy_spawner),
+                             ("flow_field.", self.flow_field)):
+            if part is not None:
+                for name, array in part.snapshot().items():
+                    data[prefix + name] = array
+
+        return data
+
+    # level has to be freshly created for the same map, snapshot made
+    # before level data or map changed raises ValueError
+    def restore(self, data):
+        if str(data["level_key"]) != self.level_key:
+            raise ValueError("Snapshot of another version of " +
+                             self.level_name)
+
+        for name in Level.SNAPSHOT_SCALARS:
+            setattr(self, name, data[name].item())
+
+        for tile, available in zip(self.tiles, data["tiles"].tolist()):
+            tile[1] = available
+
+        self.reclaimed_per_wave = [tuple(row) for row in
+                                   data["reclaimed_per_wave"].tolist()]
+
+        for prefix, part in (("enemy_pool.", self.enemy_pool),
+                             ("projectiles.", self.projectiles),
+                             ("spawner.", self.enemy_spawner),
+                             ("flow_field.", self.flow_field)):
+            if part is not None:
+                part.restore({name[len(prefix):]: array
+                              for name, array in data.items()
+                              if name.startswith(prefix)})
+
+        # lists are refilled in place, other classes keep references
+        self.enemies[:] = [Enemy.from_slot(index) for index
+                           in data["enemies"].tolist()]
+        by_index = {enemy.index: enemy for enemy in self.enemies}
+
+        self.turrets[:] = [Turret.from_snapshot(self.tiles, row, by_index)
+                           for row in data["turrets"].tolist()]
+
+    # removes dead enemies in place, Turret and EnemySpawner keep
+    # references to the list, projectile slots are freed by their pool
+    def sweep(self):
+        enemies_count = len(self.enemies)
+        pool = self.enemy_pool
+        reclaimable = ~pool.alive & pool.used
+
+        remaining = []
+        for enemy in self.enemies:
+            if reclaimable[enemy.index]:
+                pool.release(enemy.index)
+                Enemy.recycle(enemy)
+            else:
+                remaining.append(enemy)
+
+        self.enemies[:] = remaining
+        self.reclaimed_enemies += enemies_count - len(self.enemies)
+
+    def report_reclaimed(self):
+        if self.current_wave == 0:
+            return
+
+        self.reclaimed_per_wave.append((self.current_wave,
+                                        self.reclaimed_enemies,
+                                        self.reclaimed_projectiles))
+        if self.verbose:
+            print("[INFO] Wave", self.current_wave, "reclaimed",
+                  self.reclaimed_enemies, "enemies and",
+                  self.reclaimed_projectiles, "projectiles")
+
+        self.reclaimed_enemies = 0
+        self.reclaimed_projectiles = 0
+
+    # returns build tiles in form of [rect, available], spawn points and
+    # routes in form of (spawn id, paths), everything derived from the
+    # map comes from compiled level which is made on first load
+    def prepare_map(self):
+        tile_size = Level.TILE_SIZE
+        key = levelcompiler.source_key(
+            self.tile_map, self.mazing,
+            [tile_size, Level.MOVABLE_TILES, Level.MAX_ROUTES,
+             Level.MAX_EXPANSIONS])
+
+        flow_field_arrays = []
+        if self.mazing:
+            flow_field_arrays = ["flow_field." + name
+                                 for name in FlowField.ARRAYS]
+
+        if key not in Level.compiled_levels:
+            compiled = levelcompiler.load(self.level_name, key,
+                                          flow_field_arrays)
+
+            if compiled is None:
+                compiled = self.compile_map(key)
+                try:
+                    levelcompiler.save(compiled, self.level_name)
+                except OSError as error:
+                    print("[INFO] Compiled level not saved:", error)
+
+            Level.compiled_levels[key] = compiled
+
+        self.compiled = Level.compiled_levels[key]
+
+        tile_list = [[Rect(x * tile_size, y * tile_size, tile_size,
+                           tile_size), True]
+                     for x, y in self.compiled["slots"].tolist()]
+        spawn_points = [(x * tile_size, y * tile_size)
+                        for x, y in self.compiled["spawn_tiles"].tolist()]
+
+        # enemies follow flow field, every spawn has an empty route
+        if self.mazing:
+            self.flow_field = FlowField(
+                self.tile_map,
+                [tuple(tile) for tile in self.compiled["end_tiles"].tolist()],
+                Level.MOVABLE_TILES,
+                {name: self.compiled["flow_field." + name]
+                 for name in FlowField.ARRAYS})
+
+        return tile_list, spawn_points, levelcompiler.unpack_routes(
+            self.compiled)
+
+    # returns arrays of compiled level, routes are searched only here
+    def compile_map(self, key):
+        slots = []
+        spawn_tiles = []
+        end_tiles = []
+
+        for row_idx, row in enumerate(self.tile_map):
+            for column_idx, tile in enumerate(row):
+
+                if tile in [2] or (self.mazing and tile == 3):
+                    slots.append((column_idx, row_idx))
+
+                elif tile == 1:
+                    spawn_tiles.append((column_idx, row_idx))
+
+                elif tile == 4:
+                    end_tiles.append((column_idx, row_idx))
+
+        data = {"key": np.array(key)}
+        for name, tiles in (("slots", slots), ("spawn_tiles", spawn_tiles),
+                            ("end_tiles", end_tiles)):
+            data[name] = np.array(tiles, dtype=np.int32).reshape(-1, 2)
+
+        if self.mazing:
+            field = FlowField(self.tile_map, end_tiles, Level.MOVABLE_TILES)
+            for name, array in field.snapshot().items():
+                data["flow_field." + name] = array
+
+            routes = [(spawn_id, []) for spawn_id in range(len(spawn_tiles))]
+        else:
+            routes = self.prepare_routes(self.tile_map, spawn_tiles,
+                                         end_tiles)
+
+        data.update(levelcompiler.pack_routes(routes))
+
+        return data
+
+    # distance in tiles from every movable tile to the nearest end tile
+    @staticmethod
+    def distance_field(tile_map, end_tiles):
+        distance = {tile: 0 for tile in end_tiles}
+        queue = deque(end_tiles)
+
+        while queue:
+            current_tile = queue.popleft()
+
+            for next_tile in Level.neighbours(tile_map, current_tile):
+                if next_tile not in distance:
+                    distance[next_tile] = distance[current_tile] + 1
+                    queue.append(next_tile)
+
+        return distance
+
+    @staticmethod
+    def neighbours(tile_map, tile):
+        for dx, dy in Level.MOVES:
+            nx = tile[0] + dx
+            ny = tile[1] + dy
+
+            if (0 <= nx < len(tile_map[0]) and 0 <= ny < len(tile_map) and
+                    tile_map[ny][nx] in Level.MOVABLE_TILES):
+                yield nx, ny
+
+    # returns routes in form of (spawn id, paths), every spawn gets up to
+    # MAX_ROUTES routes without repeated tiles, shortest first
+    def prepare_routes(self, tile_map, spawn_tiles, end_tiles):
+        distance = self.distance_field(tile_map, end_tiles)
+        routes = []
+
+        for spawn_id, spawn_tile in enumerate(spawn_tiles):
+            if spawn_tile not in distance:
+                raise ValueError("no route from spawn {} in {}".format(
+                    spawn_tile, self.level_name))
+
+            found = []
+            expansions = 0
+            stack = [[spawn_tile]]
+
+            while (stack and len(found) < Level.MAX_ROUTES and
+                   expansions < Level.MAX_EXPANSIONS):
+                route = stack.pop()
+                current_tile = route[-1]
+
+                if distance[current_tile] == 0:
+                    found.append(route)
+                    continue
+
+                expansions += 1
+                visited = set(route)
+
+                # tiles closer to the end are tried first
+                next_tiles = sorted(
+                    (tile for tile in self.neighbours(tile_map, current_tile)
+                     if tile not in visited),
+                    key=lambda tile: distance[tile])
+
+                for next_tile in reversed(next_tiles):
+                    stack.append(route + [next_tile])
+
+            found.sort(key=len)
+            routes.extend((spawn_id, self.route_paths(route))
+                          for route in found)
+
+        return routes
+
+    # returns paths in form of (direction, length, end_tile topleft corner)
+    @staticmethod
+    def route_paths(route):
+        tile_size = Level.TILE_SIZE
+        paths = []
+
+        for previous_tile, current_tile in zip(route, route[1:]):
+            direction = (current_tile[0] - previous_tile[0],
+                         current_tile[1] - previous_tile[1])
+            end = (current_tile[0] * tile_size, current_tile[1] * tile_size)
+
+            # straight corridor is a single segment
+            if paths and paths[-1][0] == direction:
+                paths[-1] = (direction, paths[-1][1] + tile_size, end)
+            else:
+                paths.append((direction, tile_size, end))
+
+        return paths
 
 
 class LevelState(State):
-    MOVABLE_TILES = [1, 3, 4]
 
+    MAX_FRAME_TIME = 0.25
+
+    # above this part of the screen changed whole screen is redrawn
+    FULL_REDRAW_RATIO = 0.4
+
+    LABELS = ["Monety", "Życia", "Fala", "Obrażenie", "Zasięg",
+              "Prędkość ataku"]
+
+    TARGETING_CAPTIONS = {"nearest": "Cel: najbliższy",
+                          "first": "Cel: pierwszy"}
+
+    # level started when continuing before any level was played
+    DEFAULT_LEVEL = "LEVEL 1"
+
+    # map chunks of the last started map keyed by compiled level and
+    # textures, kept when the same map is started again
+    chunk_cache = {}
+
+    # screen pixels per second of panning with arrow keys
+    PAN_SPEED = 800
+    PAN_KEYS = {pgl.K_LEFT: (-1, 0), pgl.K_RIGHT: (1, 0),
+                pgl.K_UP: (0, -1), pgl.K_DOWN: (0, 1)}
+    ZOOM_KEYS = {pgl.K_EQUALS: 1, pgl.K_KP_PLUS: 1,
+                 pgl.K_MINUS: -1, pgl.K_KP_MINUS: -1}
+
+    # level is prepared on first startup
     def __init__(self, screen, resource_manager):
         super().__init__("level")
         self.resource_manager = resource_manager
-        self.startup(screen, "LEVEL 1")
+        self.screen = screen
+        self.level = None
+        # no snapshots unless state machine sets a path
+        self.save_path = None
 
     def startup(self, screen, level_name, reset=True):
         if reset is False:
-            return
+            if self.level is not None:
+                return
+            level_name = LevelState.DEFAULT_LEVEL
         self.screen = screen
         self.level_name = level_name
-        self.level_data = self.resource_manager.level_data[self.level_name]
-        self.BASICFONT = font.Font("resources/arial.ttf", 20)
+        self.BASICFONT = self.resource_manager.get_font(*Button.FONT)
+
+        # labels never change while level is running
+        self.labels = {label: self.BASICFONT.render(label, True,
+                                                    (255, 255, 255))
+                       for label in LevelState.LABELS}
 
         self.textures = self.resource_manager.scaled_textures
 
         (self.map_rect, self.panel_rect, self.stat_rect, self.turrets_rect,
          self.info_rect, self.button_rect) = self.prepare_areas()
 
-        (self.map_surface, self.tiles,
-         self.paths, self.spawn_point) = self.prepare_map()
+        self.level = Level(self.resource_manager, level_name)
+
+        tile_map = self.level.tile_map
+        self.camera = Camera(self.map_rect,
+                             (len(tile_map[0]) * Level.TILE_SIZE,
+                              len(tile_map) * Level.TILE_SIZE))
+        self.pan_keys = set()
+        self.map_chunks = self.prepare_map()
 
         self.panel_surface = Surface(self.panel_rect.size)
         self.panel_surface.blit(self.textures["panel_background"],
                                 (0, 0))
 
-        self.enemies = []
-        self.turrets = []
-        self.projectiles = []
         self.buttons = []
         self.finished = False
 
-        Turret.init(self.screen, self.turrets, self.enemies, self.projectiles,
-                    self.resource_manager)
-
-        Projectile.init(self.screen, self.resource_manager)
+        self.static_surface = None
+        self.last_static_state = None
+        self.last_panel_state = None
+        self.previous_rects = []
+        self.full_redraw = True
 
-        Enemy.init(self.screen, self.paths, self.resource_manager)
+        Turret.init_drawing(self.screen, self.resource_manager)
+        Projectile.init_drawing(self.screen, self.resource_manager)
+        Enemy.init_drawing(self.screen, self.resource_manager)
 
-        self.upgrade_button, self.sell_button = self.make_turret_buttons()
+        (self.upgrade_button, self.sell_button,
+         self.target_button) = self.make_turret_buttons()
         self.current_turret = -1
 
-        self.max_wave = self.level_data["waves"]
-        self.health = self.level_data["health"]
-        self.money = self.level_data["start_money"]
-
-        self.next_wave_time = 0
-        self.current_wave = 0
         self.speed_multiplier = 1
+        self.accumulator = 0
+        self.interpolation = 0
+
+        # every player action is recorded with simulation tick
+        self.replay = Replay(level_name)
 
-        self.enemy_spawner = EnemySpawner(screen, self.enemies,
-                                          self.spawn_point)
+        # level is saved when a wave starts
+        self.saved_wave = 0
 
         self.create_buttons()
 
+    def snapshot(self):
+        data = self.level.snapshot()
+        data["speed_multiplier"] = np.array(self.speed_multiplier)
+        data["accumulator"] = np.array(self.accumulator)
+        data["replay"] = np.array(self.replay.actions,
+                                  dtype=np.int64).reshape(-1, 4)
+        return data
+
+    def restore(self, screen, data):
+        self.startup(screen, data["level_name"].item())
+        self.level.restore(data)
+
+        self.speed_multiplier = data["speed_multiplier"].item()
+        self.accumulator = data["accumulator"].item()
+        self.replay.actions = [tuple(action) for action
+                               in data["replay"].tolist()]
+        self.saved_wave = self.level.current_wave
+
+    # snapshot is written in background, returns future of the write
+    def save(self):
+        if self.save_path is None:
+            return None
+
+        self.saved_wave = self.level.current_wave
+        return snapshot.save(self.snapshot(), self.save_path)
+
+    # replays recorded game without drawing up to given tick,
+    # then level goes on live and recording continues
+    def fast_forward(self, replay, until_tick=None):
+        self.speed_multiplier, self.replay = replay.play(self.level,
+                                                         until_tick)
+
+    # returns list of changed rects or None when whole screen changed
     def draw(self):
-        self.screen.fill((0, 0, 0))
+        static_state = (self.turrets_state(), self.camera.state())
+        if static_state != self.last_static_state:
+            self.last_static_state = static_state
+            self.static_surface = self.prepare_static()
+            self.full_redraw = True
+
+        panel_state = self.panel_state()
+        panel_dirty = panel_state != self.last_panel_state
+        self.last_panel_state = panel_state
+
+        dirty_rects = list(self.previous_rects)
+        if panel_dirty:
+            dirty_rects.append(self.panel_rect)
+
+        dirty_area = sum(rect.w * rect.h for rect in dirty_rects)
+        screen_area = self.screen.get_width() * self.screen.get_height()
+
+        full_redraw = (self.full_redraw or self.finished or dirty_area >
+                       screen_area * LevelState.FULL_REDRAW_RATIO)
+
+        if full_redraw:
+            self.screen.blit(self.static_surface, (0, 0))
+            self.full_redraw = False
+            panel_dirty = True
+        else:
+            for rect in dirty_rects:
+                self.screen.blit(self.static_surface, rect, rect)
 
-        self.screen.blit(self.map_surface, (0, 0))
+        # sprites outside viewport are skipped, partly visible ones
+        # must not cover the panel
+        self.screen.set_clip(self.map_rect)
+        sprite_rects = Enemy.draw_all(self.level.enemies, self.interpolation,
+                                      self.camera)
+        sprite_rects.extend(Projectile.draw_all(self.interpolation,
+                                                self.camera))
+        self.screen.set_clip(None)
 
-        for enemy in self.enemies:
-            enemy.draw()
+        if panel_dirty:
+            self.draw_panel()
 
-        for turret in self.turrets:
-            turret.draw()
+        self.previous_rects = sprite_rects
+
+        if full_redraw:
+            return None
 
-        for projectile in self.projectiles:
-            projectile.draw()
+        return dirty_rects + sprite_rects
 
-        self.screen.blit(self.panel_surface, self.panel_rect)
+    def draw_panel(self):
         self.draw_stats()
         self.describe_turret()
 
@@ -103,30 +744,63 @@ class LevelState(State):
         if Turret.get_selected() is not None:
             self.upgrade_button.draw()
             self.sell_button.draw()
+            self.target_button.draw()
+
+    # visible part of map with turrets and panel background, everything
+    # that only changes when turrets are placed, sold or selected or
+    # camera moves
+    def prepare_static(self):
+        static_surface = Surface(self.screen.get_size())
+        static_surface.set_clip(self.map_rect)
+        self.map_chunks.draw(static_surface, self.camera)
+
+        visible = self.camera.visible_rect()
+        for turret in self.level.turrets:
+            if visible.colliderect(turret.bounding_rect()):
+                turret.draw(static_surface, self.camera)
+
+        static_surface.set_clip(None)
+        static_surface.blit(self.panel_surface, self.panel_rect)
+
+        return static_surface
+
+    def turrets_state(self):
+        return (Turret.get_selected(),
+                tuple((turret.tile_id, turret.selected)
+                      for turret in self.level.turrets))
+
+    def panel_state(self):
+        selected = Turret.get_selected()
+        if selected is not None:
+            selected = (selected, selected.dmg, selected.range,
+                        selected.att_speed, selected.get_upgrade_cost(),
+                        selected.targeting)
+
+        return (self.level.money, self.level.health, self.level.current_wave,
+                selected, pg.mouse.get_pos(),
+                tuple(button.on for button in self.buttons),
+                len(self.buttons))
 
     def process_event(self, event):
-        if event.type == pgl.MOUSEBUTTONUP:
-            position = event.pos
+        self.process_camera_event(event)
 
-            # Placing new turret
-            if self.current_turret != -1:
-                for tile_id in range(len(self.tiles)):
-                    rect, available = self.tiles[tile_id]
+        # clicked point of the world, other buttons move camera
+        position = None
+        if (event.type == pgl.MOUSEBUTTONUP and event.button == 1 and
+                self.map_rect.collidepoint(event.pos)):
+            position = self.camera.to_world(event.pos)
 
-                    if (available and rect.collidepoint(position) and
-                       self.finished is False):
+        # Placing new turret
+        if position is not None and self.current_turret != -1:
+            tile_id = self.level.tile_id_at(position)
 
-                        if self.money >= Turret.get_cost(self.current_turret):
+            if tile_id is not None:
+                self.replay.record(self.level.tick, Replay.PLACE,
+                                   tile_id, self.current_turret)
+                self.level.place_turret(tile_id, self.current_turret)
 
-                            turret = Turret.create_turret(rect.topleft,
-                                                          self.current_turret,
-                                                          tile_id)
-                            self.turrets.append(turret)
-                            self.tiles[tile_id][1] = False
-                            self.money -= Turret.get_cost(self.current_turret)
-
-        for turret in self.turrets:
-            turret.process_event(event)
+        for turret in self.level.turrets:
+            turret.process_event(event, position)
 
         for button in self.buttons:
             button.process_event(event)
@@ -134,73 +808,99 @@ class LevelState(State):
         if Turret.get_selected() is not None:
             self.upgrade_button.process_event(event)
             self.sell_button.process_event(event)
+            self.target_button.process_event(event)
+
+    # wheel and +/- zoom, arrows and dragging with right button pan
+    def process_camera_event(self, event):
+        if event.type == pgl.MOUSEWHEEL:
+            mouse = pg.mouse.get_pos()
+            if self.map_rect.collidepoint(mouse):
+                self.camera.zoom_at(event.y, mouse)
+
+        elif (event.type == pgl.MOUSEMOTION and event.buttons[2] and
+                self.map_rect.collidepoint(event.pos)):
+            self.camera.pan(-event.rel[0], -event.rel[1])
+
+        elif event.type == pgl.KEYDOWN:
+            if event.key in LevelState.PAN_KEYS:
+                self.pan_keys.add(event.key)
+            elif event.key in LevelState.ZOOM_KEYS:
+                self.camera.zoom_at(LevelState.ZOOM_KEYS[event.key],
+                                    self.map_rect.center)
+
+        elif event.type == pgl.KEYUP:
+            self.pan_keys.discard(event.key)
 
     def update(self, dt):
-        dt *= self.speed_multiplier
+        # long frames are dropped instead of simulated all at once
+        dt = min(dt, LevelState.MAX_FRAME_TIME)
 
-        if self.finished:
-            dt = 0
+        for key in self.pan_keys:
+            dx, dy = LevelState.PAN_KEYS[key]
+            self.camera.pan(dx * LevelState.PAN_SPEED * dt,
+                            dy * LevelState.PAN_SPEED * dt)
 
-        self.next_wave_time -= dt
+        if self.level.finished is False:
+            self.accumulator += dt * self.speed_multiplier
 
-        if self.next_wave_time <= 0 and self.current_wave < self.max_wave:
-            self.current_wave += 1
-            self.next_wave_time = (sqrt(self.current_wave) + 1.5 -
-                                   5/self.current_wave)
+        while self.accumulator >= Level.TICK and self.level.finished is False:
+            self.accumulator -= Level.TICK
+            self.level.step(Level.TICK)
+            frame_profiler.count("ticks", 1)
 
-            if self.current_wave <= self.max_wave:
-                self.enemy_spawner.spawn_wave(self.current_wave)
+        if self.level.finished:
+            self.accumulator = 0
 
-        for turret in self.turrets:
-            self.money -= turret.upgrades_cost
-            turret.upgrades_cost = 0
-            turret.update(dt)
+        if self.level.current_wave != self.saved_wave:
+            self.save()
 
-        for projectile in self.projectiles:
-            projectile.update(dt)
+        self.interpolation = self.accumulator / Level.TICK
+
+        if self.level.finished and self.finished is False:
+            self.show_result()
 
         for button in self.buttons:
             button.update()
 
-        if Turret.get_selected() is not None:
+        selected_turret = Turret.get_selected()
+        if selected_turret is not None:
             self.upgrade_button.update()
             self.sell_button.update()
+            self.target_button.set_caption(
+                LevelState.TARGETING_CAPTIONS[selected_turret.targeting])
+            self.target_button.update()
+
+    def entity_counts(self):
+        enemy_stats = self.level.enemy_pool.stats()
+        projectile_stats = self.level.projectiles.stats()
+        # wave, enemies and projectiles reclaimed in the last wave
+        reclaimed = (self.level.reclaimed_per_wave[-1]
+                     if self.level.reclaimed_per_wave else (0, 0, 0))
+
+        return {"enemy_count": len(self.level.enemies),
+                "projectile_count": len(self.level.projectiles),
+                "turret_count": len(self.level.turrets),
+                "enemy_high_water": enemy_stats["high_water"],
+                "enemy_reuse": enemy_stats["reuse_rate"],
+                "projectile_high_water": projectile_stats["high_water"],
+                "projectile_reuse": projectile_stats["reuse_rate"],
+                "reclaimed_enemies": reclaimed[1],
+                "reclaimed_projectiles": reclaimed[2],
+                "chunks_rendered": self.map_chunks.rendered,
+                "chunk_bytes": self.map_chunks.bytes}
+
+    def show_result(self):
+        for button in self.buttons:
+            button.toggle_active()
 
-        self.enemy_spawner.update(dt)
-
-        self.alive_enemies = 0
-
-        for enemy in self.enemies:
-            if enemy.alive is True:
-                self.alive_enemies += 1
-            if enemy.used is False:
-                if not enemy.alive and enemy.finished is False:
-                    self.money += enemy.value
-                    enemy.used = True
-                elif enemy.finished:
-                    self.health -= 1
-                    enemy.used = True
-            enemy.update(dt)
-
-        # LEVEN WON
-        if (self.finished is False and self.alive_enemies == 0 and
-                self.current_wave == self.max_wave):
-            for button in self.buttons:
-                button.toggle_active()
-            self.buttons.append(Button(self.screen, self.screen.get_rect(),
-                                caption="Wygrałeś naciśnij aby wrócić do menu",
-                                command=self.go_to_menu))
-            self.finished = True
+        if self.level.won:
+            caption = "Wygrałeś naciśnij aby wrócić do menu"
+        else:
+            caption = "Przegrałeś naciśnij aby wrócić do menu"
 
-        # LEVEL LOST
-        if (self.finished is False and self.health <= 0):
-            for button in self.buttons:
-                button.toggle_active()
-            self.buttons.append(Button(self.screen, self.screen.get_rect(),
-                                caption="Przegrałeś naciśnij aby wrócić \
-                                         do menu",
-                                command=self.go_to_menu))
-            self.finished = True
+        self.buttons.append(Button(self.screen, self.screen.get_rect(),
+                                   caption=caption, command=self.go_to_menu))
+        self.finished = True
 
     def go_to_menu(self):
         self.done = True
@@ -232,87 +932,20 @@ class LevelState(State):
         return (map_rect, panel_rect, stat_rect, turret_rect,
                 info_rect, button_rect)
 
+    # chunks are rendered when camera first shows them and kept for
+    # later startups of the same map
     def prepare_map(self):
-        map_surface = Surface(self.map_rect.size)
-        # print(self.resource_manager.maps)
-        tile_map = self.resource_manager.maps[self.level_name]
-
-        tile_size = self.textures["tile0"].get_rect().w
-
-        tile_list = []
-
-        for row_idx, row in enumerate(tile_map):
-            for column_idx, tile in enumerate(row):
-
-                tile_rect = self.textures["tile" + str(tile)].get_rect().copy()
-                tile_rect.topleft = (column_idx * tile_size,
-                                     row_idx * tile_size)
-
-                map_surface.blit(self.textures["tile" + str(tile)],
-                                 tile_rect)
-
-                if tile in [2]:
-                    tile_list.append([tile_rect, True])
-
-                elif tile == 1:
-                    spawn_point = tile_rect.topleft
-                    spawn_tile = (column_idx, row_idx)
-
-                elif tile == 4:
-                    end_tile = (column_idx, row_idx)
-
-        paths = self.prepare_paths(tile_map, spawn_tile, end_tile)
-
-        return map_surface, tile_list, paths, spawn_point
+        key = (str(self.level.compiled["key"]),
+               self.resource_manager.texture_key())
 
-    # returns paths in form of (direction, length, end_tile topleft corner)
-    def prepare_paths(self, tile_map, spawn_tile, end_tile):
-        paths = []
-
-        current_tile = spawn_tile
-        previous_tile = spawn_tile
-
-        DX = [0, 0, 1, -1]
-        DY = [1, -1, 0, 0]
-
-        map_height = len(tile_map)
-        map_length = len(tile_map[0])
-        tile_size = self.textures["tile0"].get_rect().w
-
-        while current_tile != end_tile:
-            direction = 0
-            path_length = 0
-
-            for move_type in range(4):
-                nx = current_tile[0] + DX[move_type]
-                ny = current_tile[1] + DY[move_type]
-
-                if (0 <= nx < map_length and 0 <= ny < map_height and
-                        (nx, ny) != previous_tile and
-                        tile_map[ny][nx] in LevelState.MOVABLE_TILES):
-
-                    direction = move_type
-                    break
+        if key not in LevelState.chunk_cache:
+            LevelState.chunk_cache = {key: MapChunks(
+                self.level.tile_map, Level.TILE_SIZE, self.tile_texture)}
 
-            while True:
-                tmp_tile = (current_tile[0] + DX[direction],
-                            current_tile[1] + DY[direction])
+        return LevelState.chunk_cache[key]
 
-                if (0 <= tmp_tile[0] < map_length and
-                        0 <= tmp_tile[1] < map_height and
-                        tile_map[tmp_tile[1]][tmp_tile[0]] in
-                        LevelState.MOVABLE_TILES):
-                    previous_tile = current_tile
-                    current_tile = tmp_tile
-                    path_length += 1
-                else:
-                    break
-
-            paths.append(((DX[direction], DY[direction]),
-                          path_length * tile_size,
-                          (current_tile[0] * tile_size,
-                           current_tile[1] * tile_size)))
-        return paths
+    def tile_texture(self, tile, zoom):
+        return self.resource_manager.get_scaled("tile" + str(tile), zoom)
 
     def draw_stats(self):
         white = (255, 255, 255)
@@ -328,18 +961,18 @@ class LevelState(State):
         wave_rect = health_rect.copy()
         wave_rect.y += 30
 
-        money_text1 = self.BASICFONT.render("Monety", True, white)
-        money_text2 = self.BASICFONT.render(str(self.money), True, white)
+        money_text1 = self.labels["Monety"]
+        money_text2 = self.render_text(str(self.level.money), white)
 
-        health_text1 = self.BASICFONT.render("Życia", True, white)
-        health_text2 = self.BASICFONT.render(str(self.health), True, white)
+        health_text1 = self.labels["Życia"]
+        health_text2 = self.render_text(str(self.level.health), white)
 
-        wave_text1 = self.BASICFONT.render("Fala", True, white)
-        wave_text2 = self.BASICFONT.render(str(self.current_wave), True, white)
+        wave_text1 = self.labels["Fala"]
+        wave_text2 = self.render_text(str(self.level.current_wave), white)
 
-        cost0 = self.BASICFONT.render(str(Turret.get_cost(0)), True, white)
-        cost1 = self.BASICFONT.render(str(Turret.get_cost(1)), True, white)
-        cost2 = self.BASICFONT.render(str(Turret.get_cost(2)), True, white)
+        cost0 = self.render_text(str(Turret.get_cost(0)), white)
+        cost1 = self.render_text(str(Turret.get_cost(1)), white)
+        cost2 = self.render_text(str(Turret.get_cost(2)), white)
         x, y = self.buttons[0].rect.midbottom
         y += 3
         self.screen.blit(cost0, cost0.get_rect(midtop=(x, y)))
@@ -363,6 +996,9 @@ class LevelState(State):
         self.screen.blit(wave_text2, wave_text2.get_rect(
                          midright=wave_rect.midright))
 
+    def render_text(self, text, color):
+        return text_cache.render(self.BASICFONT, text, color)
+
     def create_buttons(self):
         x, y, w, h = self.turrets_rect
         self.buttons.append(Button(self.screen,
@@ -422,6 +1058,8 @@ class LevelState(State):
         self.upgrade_button.set_command(
             self.upgrade_decorator(selected_turret))
         self.sell_button.set_command(self.sell_turret, selected_turret)
+        self.target_button.set_command(self.switch_targeting,
+                                       selected_turret)
 
         dmg_rect = self.info_rect.copy()
         dmg_rect.h = 30
@@ -435,20 +1073,17 @@ class LevelState(State):
         wave_rect = range_rect.copy()
         wave_rect.y += 30
 
-        dmg_text1 = self.BASICFONT.render("Obrażenie", True, white)
-        dmg_text2 = self.BASICFONT.render(str(selected_turret.dmg), True,
-                                          white)
+        dmg_text1 = self.labels["Obrażenie"]
+        dmg_text2 = self.render_text(str(selected_turret.dmg), white)
 
-        range_text1 = self.BASICFONT.render("Zasięg", True, white)
-        range_text2 = self.BASICFONT.render(str(selected_turret.range), True,
-                                            white)
+        range_text1 = self.labels["Zasięg"]
+        range_text2 = self.render_text(str(selected_turret.range), white)
 
-        wave_text1 = self.BASICFONT.render("Prędkość ataku", True, white)
-        wave_text2 = self.BASICFONT.render(str(selected_turret.att_speed),
-                                           True, white)
+        wave_text1 = self.labels["Prędkość ataku"]
+        wave_text2 = self.render_text(str(selected_turret.att_speed), white)
 
-        upgrade_cost_text = self.BASICFONT.render(
-                str(selected_turret.get_upgrade_cost()), True, white)
+        upgrade_cost_text = self.render_text(
+                str(selected_turret.get_upgrade_cost()), white)
 
         upgrade_cost_rect = self.upgrade_button.rect.copy()
         upgrade_cost_rect.y += 50
@@ -495,28 +1130,44 @@ class LevelState(State):
                              get_rect(center=delete_rect_center),
                              [self.textures["sell_button"]])
 
-        return upgrade_button, sell_button
+        target_rect = Rect(0, 0, 200, 34)
+        target_rect.center = (wave_rect.centerx, upgrade_rect_center[1] + 105)
+        target_button = Button(self.screen, target_rect,
+                               caption=LevelState.TARGETING_CAPTIONS[
+                                   Turret.TARGETING_MODES[0]],
+                               bg_color=(60, 60, 60, 255))
+
+        return upgrade_button, sell_button, target_button
 
     def set_current_turret(self, turre_type=0):
         self.current_turret = turre_type
 
     def set_speed_multiplier(self, speed_multiplier):
+        self.replay.record_speed(self.level.tick, speed_multiplier)
         self.speed_multiplier = speed_multiplier
 
     def sell_turret(self, selected_turret):
-        self.money += int(selected_turret.used_money * 0.4)
+        self.replay.record(self.level.tick, Replay.SELL,
+                           selected_turret.tile_id)
+        self.level.sell_turret(selected_turret)
 
-        self.tiles[selected_turret.tile_id][1] = True
+        Turret.selected_turret = None
 
-        del(self.turrets[self.turrets.index(selected_turret)])
+    # nearest and first targeting take turns
+    def switch_targeting(self, selected_turret):
+        mode = ((Turret.TARGETING_MODES.index(selected_turret.targeting) + 1) %
+                len(Turret.TARGETING_MODES))
 
-        Turret.selected_turret = None
+        self.replay.record(self.level.tick, Replay.TARGET,
+                           selected_turret.tile_id, mode)
+        self.level.set_targeting(selected_turret, mode)
 
     def upgrade_decorator(self, selected_turret):
 
         def upgrade_turret():
-            if self.money >= selected_turret.get_upgrade_cost():
-                selected_turret.upgrade()
+            self.replay.record(self.level.tick, Replay.UPGRADE,
+                               selected_turret.tile_id)
+            self.level.upgrade_turret(selected_turret)
         return upgrade_turret
 
 
@@ -535,42 +1186,73 @@ class Turret:
 
     COST = [20, 50, 70]
 
+    TARGETING_MODES = ("nearest", "first")
+
+    NAMES = ["turret" + str(turret_type)
+             for turret_type in range(len(BASE_STATS))]
+
+    __slots__ = ("turret_type", "tile_id", "dmg", "range", "att_speed",
+                 "current_target", "target_generation", "targeting",
+                 "texture_rect", "attack_timeout", "selected", "lvl",
+                 "used_money")
+
+    SNAPSHOT_FIELDS = ("tile_id", "turret_type", "dmg", "range", "att_speed",
+                       "attack_timeout", "lvl", "used_money", "selected",
+                       "targeting", "target_index", "target_generation")
+
     @staticmethod
-    def init(screen, turrets, enemies, projectiles, resource_manager):
-        Turret.screen = screen
+    def init(turrets, enemies, enemy_grid):
         Turret.turrets = turrets
         Turret.enemies = enemies
-        Turret.projectiles = projectiles
-        Turret.resource_manager = resource_manager
-        Turret.textures = resource_manager.scaled_textures
+        Turret.enemy_grid = enemy_grid
         Turret.selected_turret = None
 
+    @staticmethod
+    def init_drawing(screen, resource_manager):
+        Turret.screen = screen
+        Turret.resource_manager = resource_manager
+
     def __init__(self, rect_topleft, turret_type, tile_id):
         self.turret_type = turret_type
-        self.turret_name = "turret" + str(turret_type)
         self.tile_id = tile_id
 
         self.dmg, self.range, self.att_speed = Turret.BASE_STATS[turret_type]
-        self.cost = Turret.COST[turret_type]
 
+        # views are reused, generation tells if target is still the same
         self.current_target = None
+        self.target_generation = -1
+        self.targeting = "nearest"
 
-        self.texture = Turret.textures[self.turret_name].copy()
-        self.texture_rect = self.texture.get_rect(topleft=rect_topleft)
-        self.center = self.texture_rect.center
+        self.texture_rect = Rect(rect_topleft,
+                                 (Level.TILE_SIZE, Level.TILE_SIZE))
         self.attack_timeout = 0
         self.selected = True
         self.lvl = 1
-        self.upgrades_cost = 0
-        self.used_money = self.cost
+        self.used_money = Turret.COST[turret_type]
+
+    @property
+    def center(self):
+        return self.texture_rect.center
 
-    def draw_range(self):
+    # part of the world turret draws on, range included when selected
+    def bounding_rect(self):
         if self.selected:
-            circle(Turret.screen, (255, 0, 0), self.center, self.range, 4)
+            return self.texture_rect.inflate(2 * self.range, 2 * self.range)
+        return self.texture_rect
 
-    def draw(self):
-        self.draw_range()
-        Turret.screen.blit(self.texture, self.texture_rect)
+    def draw_range(self, surface, camera):
+        if self.selected:
+            circle(surface, (255, 0, 0), camera.to_screen(self.center),
+                   round(self.range * camera.zoom), 4)
+
+    def draw(self, surface, camera):
+        self.draw_range(surface, camera)
+        surface.blit(self.get_texture(camera.zoom),
+                     camera.to_screen(self.texture_rect.topleft))
+
+    def get_texture(self, zoom=1):
+        return Turret.resource_manager.get_scaled(
+            Turret.NAMES[self.turret_type], zoom)
 
     def shoot(self):
 
@@ -580,17 +1262,18 @@ class Turret:
         self.current_target = self.update_target()
 
         if self.current_target is not None:
-            self.projectiles.append(
-                Projectile.create_projectile(self.center,
-                                             self.turret_type,
-                                             self.current_target, self.dmg))
+            self.target_generation = self.current_target.generation
+            Projectile.create_projectile(self.center, self.turret_type,
+                                         self.current_target, self.dmg)
 
-        self.attack_timeout = self.att_speed
+        # overshoot is carried so fire rate does not depend on tick length
+        self.attack_timeout = max(self.attack_timeout + self.att_speed, 0)
 
     def update_target(self):
         if self.current_target is None:
             return self.find_target()
-        elif (self.current_target.alive is False or
+        elif (self.current_target.generation != self.target_generation or
+                self.current_target.alive is False or
                 Turret.euclid_dist(self.center, self.current_target.center)
                 > self.range):
             return self.find_target()
@@ -598,17 +1281,28 @@ class Turret:
 
     def find_target(self):
         target = None
-        distance = 1e9
+        target_idx = None
+        best = 1e9
+        first = self.targeting == "first"
+        center = self.center
+
+        for idx, enemy in Turret.enemy_grid.query(center, self.range):
+            tmp_dist = Turret.euclid_dist(center, enemy.center)
 
-        for enemy in Turret.enemies:
-            if enemy.alive is False:
+            if tmp_dist > self.range:
                 continue
 
-            tmp_dist = Turret.euclid_dist(self.center, enemy.center)
+            # routes differ in length, first is the closest to the end
+            score = enemy.remaining if first else tmp_dist
 
-            if tmp_dist < distance and tmp_dist <= self.range:
-                distance = tmp_dist
+            if score > best:
+                continue
+
+            # same result as scanning enemies in order
+            if score < best or idx < target_idx:
+                best = score
                 target = enemy
+                target_idx = idx
 
         return target
 
@@ -618,13 +1312,14 @@ class Turret:
 
     def upgrade(self):
         self.used_money += Turret.UPGRADE_COST[self.turret_type] * self.lvl
-        self.upgrades_cost += Turret.UPGRADE_COST[self.turret_type] * self.lvl
         self.lvl += 1
         self.dmg += Turret.UPGRADES[self.turret_type][0]
 
-    def process_event(self, event):
-        if event.type == pgl.MOUSEBUTTONUP:
-            if self.texture_rect.collidepoint(event.pos):
+    # position is clicked point of the world, None when map was not
+    # clicked
+    def process_event(self, event, position):
+        if event.type == pgl.MOUSEBUTTONUP and position is not None:
+            if self.texture_rect.collidepoint(position):
                 current_select = self.selected
                 for turret in self.turrets:
                     turret.selected = False
@@ -640,6 +1335,39 @@ class Turret:
     def create_turret(rect_topleft, turret_type, tile_id):
         return Turret(rect_topleft, turret_type, tile_id)
 
+    # row of numbers in order of SNAPSHOT_FIELDS
+    def snapshot(self):
+        target = self.current_target
+        return (self.tile_id, self.turret_type, self.dmg, self.range,
+                self.att_speed, self.attack_timeout, self.lvl,
+                self.used_money, self.selected,
+                Turret.TARGETING_MODES.index(self.targeting),
+                -1 if target is None else target.index,
+                self.target_generation)
+
+    @staticmethod
+    def from_snapshot(tiles, row, enemies_by_index):
+        (tile_id, turret_type, dmg, turret_range, att_speed, attack_timeout,
+         lvl, used_money, selected, targeting, target_index,
+         target_generation) = row
+
+        turret = Turret(tiles[int(tile_id)][0].topleft, int(turret_type),
+                        int(tile_id))
+        turret.dmg = int(dmg)
+        turret.range = int(turret_range)
+        turret.att_speed = att_speed
+        turret.attack_timeout = attack_timeout
+        turret.lvl = int(lvl)
+        turret.used_money = int(used_money)
+        turret.selected = bool(selected)
+        turret.targeting = Turret.TARGETING_MODES[int(targeting)]
+
+        # view of a released slot is never read again
+        turret.current_target = enemies_by_index.get(int(target_index))
+        turret.target_generation = int(target_generation)
+
+        return turret
+
     @staticmethod
     def get_selected():
         return Turret.selected_turret
@@ -658,6 +1386,8 @@ class Turret:
 
 class Enemy:
 
+    __slots__ = ("enemy_type", "route", "index", "generation")
+
     # HP SPEED VALUE
     BASE_STATS = [(10, 700, 3),
                   (5, 1000, 3),
@@ -665,180 +1395,232 @@ class Enemy:
 
     UPGRADES = [(2), (5), (5)]
 
+    NAMES = ["enemy" + str(enemy_type)
+             for enemy_type in range(len(BASE_STATS))]
+
     @staticmethod
-    def init(screen, paths, resource_manager):
+    def init(pool):
+        Enemy.pool = pool
+        # views of released slots waiting for reuse
+        Enemy.free_views = []
+
+    @staticmethod
+    def init_drawing(screen, resource_manager):
         Enemy.screen = screen
-        Enemy.paths = paths
         Enemy.resource_manager = resource_manager
-        Enemy.textures = resource_manager.scaled_textures
-
-    def __init__(self, rect_topleft, enemy_type, wave):
-        self.enemy_type = enemy_type
-        self.enemy_name = "enemy" + str(enemy_type)
-
-        self.path_id = 0
-        self.passed_distance = 0
-
-        self.hp, self.speed, self.value = Enemy.BASE_STATS[enemy_type]
-        self.hp += (wave - 1) * Enemy.UPGRADES[enemy_type]
-        self.alive = True
-        self.finished = False
-        self.used = False
-
-        self.texture = Enemy.textures[self.enemy_name].copy()
-        self.texture_rect = self.texture.get_rect(topleft=rect_topleft)
-        self.center = list(self.texture_rect.center)
-
-    def draw(self):
-        if self.alive is True:
-            Enemy.screen.blit(self.texture, self.texture_rect)
-
-    def update(self, dt):
-
-        if self.hp <= 0:
-            self.alive = False
-            return
 
-        left_distance = dt * self.speed
+    # thin view of a slot in Enemy.pool
+    def __init__(self, rect_topleft, enemy_type, wave, route=0):
+        self.reset(rect_topleft, enemy_type, wave, route)
 
-        if self.path_id == len(Enemy.paths):
-            return None
-
-        direction, distance, end_point = Enemy.paths[self.path_id]
+    def reset(self, rect_topleft, enemy_type, wave, route=0):
+        hp, speed, value = Enemy.BASE_STATS[enemy_type]
+        hp += (wave - 1) * Enemy.UPGRADES[enemy_type]
 
-        if left_distance + self.passed_distance <= distance:
-            self.center[0] += direction[0] * left_distance
-            self.center[1] += direction[1] * left_distance
-            self.passed_distance += left_distance
-            self.texture_rect.center = tuple(self.center)
-        else:
-            left_distance -= distance - self.passed_distance
+        self.enemy_type = enemy_type
+        self.route = route
+        self.index = Enemy.pool.spawn(rect_topleft, enemy_type, hp, speed,
+                                      value, route)
+        self.generation = int(Enemy.pool.generation[self.index])
 
-            self.texture_rect.topleft = end_point
-            self.center = list(self.texture_rect.center)
+    # view of a slot which is already filled, used by snapshots
+    @staticmethod
+    def from_slot(index):
+        enemy = Enemy.__new__(Enemy)
+        enemy.enemy_type = int(Enemy.pool.enemy_type[index])
+        enemy.route = int(Enemy.pool.route[index])
+        enemy.index = index
+        enemy.generation = int(Enemy.pool.generation[index])
+        return enemy
+
+    @property
+    def alive(self):
+        return bool(Enemy.pool.generation[self.index] == self.generation and
+                    Enemy.pool.alive[self.index])
+
+    @property
+    def finished(self):
+        return bool(Enemy.pool.finished[self.index])
+
+    @property
+    def used(self):
+        return bool(Enemy.pool.used[self.index])
+
+    @property
+    def hp(self):
+        return int(Enemy.pool.hp[self.index])
+
+    @property
+    def value(self):
+        return int(Enemy.pool.value[self.index])
+
+    @property
+    def center(self):
+        return Enemy.pool.position[self.index].tolist()
+
+    @property
+    def distance(self):
+        return float(Enemy.pool.distance[self.index])
+
+    @property
+    def remaining(self):
+        return float(Enemy.pool.remaining_distance(self.index))
+
+    # draws alive enemies seen by camera in order of the list,
+    # returns changed rects
+    @staticmethod
+    def draw_all(enemies, interpolation, camera):
+        pool = Enemy.pool
+        textures = [Enemy.resource_manager.get_scaled(name, camera.zoom)
+                    for name in Enemy.NAMES]
 
-            self.path_id += 1
-            self.passed_distance = 0
+        idx = np.fromiter((enemy.index for enemy in enemies), dtype=np.int64,
+                          count=len(enemies))
+        idx = idx[pool.alive[idx]]
 
-            if self.path_id == len(Enemy.paths):
-                self.alive = False
-                self.finished = True
-                return None
+        positions = pool.render_positions(idx, interpolation)
+        seen = camera.visible(positions, Level.TILE_SIZE)
+        idx = idx[seen]
+        positions = camera.to_screen_array(positions[seen])
 
-            direction, distance, end_point = Enemy.paths[self.path_id]
+        blit_sequence = []
+        for enemy_type, (x, y) in zip(pool.enemy_type[idx].tolist(),
+                                      positions.tolist()):
+            texture = textures[enemy_type]
+            blit_sequence.append((texture, texture.get_rect(center=(x, y))))
 
-            self.center[0] += direction[0] * left_distance
-            self.center[1] += direction[1] * left_distance
-            self.passed_distance += left_distance
-            self.texture_rect.center = tuple(self.center)
+        return Enemy.screen.blits(blit_sequence)
 
     def get_hit(self, dmg):
-        self.hp -= dmg
+        Enemy.pool.hp[self.index] -= dmg
+
+    # reuses view of a released slot when there is one
+    @staticmethod
+    def create_enemy(rect_topleft, enemy_type, wave, route=0):
+        if Enemy.free_views:
+            enemy = Enemy.free_views.pop()
+            enemy.reset(rect_topleft, enemy_type, wave, route)
+            return enemy
+        return Enemy(rect_topleft, enemy_type, wave, route)
 
     @staticmethod
-    def create_enemy(rect_topleft, enemy_type, wave):
-        return Enemy(rect_topleft, enemy_type, wave)
+    def recycle(enemy):
+        Enemy.free_views.append(enemy)
 
 
 class Projectile:
 
     BASE_SPEED = [2500, 2500, 2500]
 
+    NAMES = ["projectile" + str(projectile_type)
+             for projectile_type in range(len(BASE_SPEED))]
+
     @staticmethod
-    def init(screen, resource_manager):
+    def init(projectiles):
+        Projectile.projectiles = projectiles
+
+    @staticmethod
+    def init_drawing(screen, resource_manager):
         Projectile.screen = screen
         Projectile.resource_manager = resource_manager
-        Projectile.textures = resource_manager.scaled_textures
-
-    def __init__(self, rect_center, projectile_type, target, dmg):
-
-        self.projectile_type = projectile_type
-        self.projectile_name = "projectile" + str(projectile_type)
-
-        self.speed = Projectile.BASE_SPEED[projectile_type]
-        self.alive = True
-
-        self.texture = Projectile.textures[self.projectile_name].copy()
-        self.texture_rect = self.texture.get_rect(center=rect_center)
-        self.center = list(self.texture_rect.center)
-        self.target = target
-        self.dmg = dmg
-
-        self.direction = self.get_direction()
-
-    def draw(self):
-        if self.alive:
-            Projectile.screen.blit(self.texture, self.texture_rect)
 
-    def update(self, dt):
-        if self.alive is False:
-            return
-        if self.target.alive is False:
-            self.alive = False
-            return
-
-        self.direction = self.get_direction()
-        current_distance = Turret.euclid_dist(self.center, self.target.center)
-
-        if current_distance <= 15:
-            self.alive = False
-            self.target.get_hit(self.dmg)
-        else:
-            self.center[0] += dt * self.speed * self.direction[0]
-            self.center[1] += dt * self.speed * self.direction[1]
-            self.texture_rect.center = self.center
-
-    def get_direction(self):
-        direction = Vector2(self.target.center[0] - self.center[0],
-                            self.target.center[1] - self.center[1])
-
-        try:
-            direction = direction.normalize()
-            return direction
-        except ValueError:
-            return Vector2(0, 0)
+    # draws active projectiles seen by camera, returns changed rects
+    @staticmethod
+    def draw_all(interpolation, camera):
+        projectiles = Projectile.projectiles
+        textures = [Projectile.resource_manager.get_scaled(name, camera.zoom)
+                    for name in Projectile.NAMES]
+        offsets = [(texture.get_width() / 2, texture.get_height() / 2)
+                   for texture in textures]
+
+        idx = np.flatnonzero(projectiles.active)
+
+        positions = projectiles.render_positions(idx, interpolation)
+        seen = camera.visible(positions, Level.TILE_SIZE)
+        idx = idx[seen]
+        positions = camera.to_screen_array(positions[seen])
+
+        blit_sequence = []
+        for projectile_type, (x, y) in zip(
+                projectiles.projectile_type[idx].tolist(),
+                positions.tolist()):
+            offset = offsets[projectile_type]
+            blit_sequence.append((textures[projectile_type],
+                                  (x - offset[0], y - offset[1])))
+
+        return Projectile.screen.blits(blit_sequence)
 
     @staticmethod
     def create_projectile(rect_center, projectile_type, target, dmg):
-        return Projectile(rect_center, projectile_type, target, dmg)
+        return Projectile.projectiles.spawn(
+            rect_center, projectile_type, target.index, target.generation,
+            dmg, Projectile.BASE_SPEED[projectile_type])
 
 
 class EnemySpawner:
+    """
 
-    def __init__(self, screen, enemies, spawn_tile):
-        self.screen = screen
+    Enemies of started waves wait in a heap ordered by simulation time
+    they spawn at, any number of them can spawn in one update.
+
+    """
+
+    def __init__(self, enemies, spawn_tiles, spawn_routes, schedule):
         self.enemies = enemies
-        self.spawn_tile = spawn_tile
-        self.wave_number = 0
-        self.formulas = [
-            lambda x: x,
-            lambda x: x - 5 if x > 6 else 0,
-            lambda x: x - 9 if x > 10 else 0
-        ]
-        self.spawn_numbers = [0, 0, 0]
+        self.spawn_tiles = spawn_tiles
+        self.spawn_routes = spawn_routes
+        self.schedule = schedule
+
+        self.time = 0
+        # events in form of (time, order, enemy type, wave, spawn id),
+        # spawn id is -1 when spawns take turns
+        self.queue = []
+        self.order = 0
+        self.next_spawn = 0
+        self.spawned = [0] * len(spawn_tiles)
 
     def spawn_wave(self, wave_number):
-        self.wave_number += 1
-        self.spawn_numbers[0] += self.formulas[0](wave_number)
-        self.spawn_numbers[1] += self.formulas[1](wave_number)
-        self.spawn_numbers[2] += self.formulas[2](wave_number)
+        for offset, enemy_type, spawn_id in self.schedule.wave(wave_number):
+            heapq.heappush(self.queue, (self.time + offset, self.order,
+                                        enemy_type, wave_number,
+                                        -1 if spawn_id is None else spawn_id))
+            self.order += 1
+
+    def pending(self):
+        return len(self.queue)
+
+    def snapshot(self):
+        return {"time": np.array(self.time),
+                "order": np.array(self.order),
+                "queue": np.array(self.queue, dtype=np.float64).reshape(-1, 5),
+                "next_spawn": np.array(self.next_spawn),
+                "spawned": np.array(self.spawned, dtype=np.int64)}
+
+    # heap is stored in its order so it stays a heap
+    def restore(self, data):
+        self.time = float(data["time"])
+        self.order = int(data["order"])
+        self.queue = [(time, int(order), int(enemy_type), int(wave_number),
+                       int(spawn_id)) for time, order, enemy_type,
+                      wave_number, spawn_id in data["queue"].tolist()]
+        self.next_spawn = int(data["next_spawn"])
+        self.spawned = data["spawned"].tolist()
 
     def update(self, dt):
-        for enemy_type, number in enumerate(self.spawn_numbers):
-            if number != 0:
-                if len(self.enemies):
-                    previous_rect = self.enemies[-1].texture_rect
-                    if previous_rect.colliderect(Rect(*self.spawn_tile,
-                                                 64, 64)):
-                        return
-                    else:
-                        self.spawn_numbers[enemy_type] -= 1
-                        self.enemies.append(Enemy(self.spawn_tile, enemy_type,
-                                                  self.wave_number))
-                        return
-                else:
-                    self.spawn_numbers[enemy_type] -= 1
-                    self.enemies.append(Enemy(self.spawn_tile, enemy_type,
-                                        self.wave_number))
-                    return
-            self.spawninig_done = True
+        self.time += dt
+
+        while self.queue and self.queue[0][0] <= self.time:
+            _, _, enemy_type, wave_number, spawn_id = heapq.heappop(
+                self.queue)
+
+            if spawn_id < 0:
+                spawn_id = self.next_spawn
+                self.next_spawn = (spawn_id + 1) % len(self.spawn_tiles)
+
+            # enemies from one spawn are spread over its routes
+            routes = self.spawn_routes[spawn_id]
+            route = routes[self.spawned[spawn_id] % len(routes)]
+
+            self.spawned[spawn_id] += 1
+            self.enemies.append(Enemy.create_enemy(
+                self.spawn_tiles[spawn_id], enemy_type, wave_number, route))
@@ -5,6 +5,8 @@ chooses suitable window size
 
 """
 
+import argparse
+import time
 import pygame as pg
 from statemachine import StateMachine
 
@@ -12,6 +14,18 @@ WINDOW_SIZE = (1280, 768)
 
 
 def main():
+    start_time = time.perf_counter()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trace", metavar="PATH",
+                        help="save frame timings to CSV file on exit")
+    parser.add_argument("--record", metavar="PATH",
+                        help="save player actions of the level to replay file")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="start from replay file at maximum speed")
+    parser.add_argument("--until", type=int, default=None,
+                        help="stop replay at this tick and play on")
+    args = parser.parse_args()
+
     pg.init()
 
     window_size = None
@@ -29,7 +43,10 @@ def main():
 
     screen = pg.display.set_mode(window_size)
     pg.display.set_caption("Gra")
-    statemachine = StateMachine(screen)
+    statemachine = StateMachine(screen, args.trace, args.record, start_time)
+
+    if args.replay is not None:
+        statemachine.play_replay(args.replay, args.until)
 
     statemachine.main_loop()
 
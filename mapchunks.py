@@ -0,0 +1,91 @@
+"""
+
+This module contains class MapChunks which is responsible for drawing
+level map in square chunks of tiles, so only the visible part of a
+large map is rendered and kept in memory
+
+"""
+
+from collections import OrderedDict
+
+from pygame.surface import Surface
+
+
+class MapChunks:
+    """
+
+    Chunks are rendered when they first become visible and kept per
+    zoom level, least recently drawn ones are dropped when their
+    pixels take more than MAX_BYTES.
+
+    """
+
+    CHUNK_TILES = 8
+    MAX_BYTES = 64 * 1024 * 1024
+
+    # texture_of(tile, zoom) returns texture of tile scaled by zoom
+    def __init__(self, tile_map, tile_size, texture_of):
+        self.tile_map = tile_map
+        self.tile_size = tile_size
+        self.texture_of = texture_of
+
+        self.columns = -(-len(tile_map[0]) // MapChunks.CHUNK_TILES)
+        self.rows = -(-len(tile_map) // MapChunks.CHUNK_TILES)
+
+        # chunks in form of (zoom, column, row): surface
+        self.chunks = OrderedDict()
+        self.bytes = 0
+        self.rendered = 0
+
+    def chunk(self, zoom, column, row):
+        key = (zoom, column, row)
+
+        if key in self.chunks:
+            self.chunks.move_to_end(key)
+            return self.chunks[key]
+
+        chunk_tiles = MapChunks.CHUNK_TILES
+        tile_size = round(self.tile_size * zoom)
+        rows = [map_row[column * chunk_tiles:(column + 1) * chunk_tiles]
+                for map_row in
+                self.tile_map[row * chunk_tiles:(row + 1) * chunk_tiles]]
+
+        surface = Surface((len(rows[0]) * tile_size, len(rows) * tile_size))
+        surface.blits([(self.texture_of(tile, zoom),
+                        (column_idx * tile_size, row_idx * tile_size))
+                       for row_idx, tiles in enumerate(rows)
+                       for column_idx, tile in enumerate(tiles)],
+                      doreturn=False)
+
+        self.chunks[key] = surface
+        self.bytes += (surface.get_width() * surface.get_height() *
+                       surface.get_bytesize())
+        self.rendered += 1
+
+        while self.bytes > MapChunks.MAX_BYTES and len(self.chunks) > 1:
+            _, dropped = self.chunks.popitem(last=False)
+            self.bytes -= (dropped.get_width() * dropped.get_height() *
+                           dropped.get_bytesize())
+
+        return surface
+
+    # draws chunks seen by camera, surface should be clipped to viewport
+    def draw(self, surface, camera):
+        zoom = camera.zoom
+        world_chunk = self.tile_size * MapChunks.CHUNK_TILES
+        screen_chunk = round(self.tile_size * zoom) * MapChunks.CHUNK_TILES
+
+        visible = camera.visible_rect()
+        first_column = max(visible.left // world_chunk, 0)
+        last_column = min((visible.right - 1) // world_chunk,
+                          self.columns - 1)
+        first_row = max(visible.top // world_chunk, 0)
+        last_row = min((visible.bottom - 1) // world_chunk, self.rows - 1)
+
+        origin = camera.origin()
+        surface.blits([(self.chunk(zoom, column, row),
+                        (origin[0] + column * screen_chunk,
+                         origin[1] + row * screen_chunk))
+                       for row in range(first_row, last_row + 1)
+                       for column in range(first_column, last_column + 1)],
+                      doreturn=False)
@@ -0,0 +1,100 @@
+"""
+
+This module contains memory benchmark which plays a level with scripted
+turret plan and reports texture surface bytes per wave that copying
+texture for every entity would allocate, estimated from spawn counts
+and texture sizes. Entities share textures of resource manager, so
+none of these bytes are allocated
+
+Usage:
+python3 memorybench.py "LEVEL 3" --plan plan.json
+
+"""
+
+import argparse
+
+import headless
+from levelstate import Level
+
+
+def surface_bytes(texture):
+    return texture.get_width() * texture.get_height() * texture.get_bytesize()
+
+
+class WaveCounter:
+    """
+
+    Spawn counters at the start of a wave.
+
+    """
+
+    def __init__(self, level):
+        self.enemies = level.enemy_pool.spawned
+        self.projectiles = level.projectiles.spawned
+        self.turrets = len(level.turrets)
+
+
+def wave_row(wave, start, level, texture_bytes):
+    enemies = level.enemy_pool.spawned - start.enemies
+    projectiles = level.projectiles.spawned - start.projectiles
+    turrets = max(len(level.turrets) - start.turrets, 0)
+
+    # estimate, every entity used to copy its texture on creation
+    copied = (enemies * texture_bytes["enemy"] +
+              projectiles * texture_bytes["projectile"] +
+              turrets * texture_bytes["turret"])
+
+    return wave, enemies, projectiles, turrets, copied
+
+
+def run(level_name, plan, max_ticks):
+    resource_manager = headless.init_display()
+    state = headless.make_level_state(resource_manager, level_name)
+    level = state.level
+
+    textures = resource_manager.scaled_textures
+    texture_bytes = {name: surface_bytes(textures[name + "0"])
+                     for name in ("enemy", "projectile", "turret")}
+
+    rows = []
+    next_action = 0
+    wave = level.current_wave
+    start = WaveCounter(level)
+
+    while level.finished is False and level.tick < max_ticks:
+        next_action = headless.apply_due_actions(level, plan, next_action)
+
+        state.update(Level.TICK)
+        state.draw()
+
+        # wave 0 is time before first wave
+        if level.current_wave != wave or level.finished:
+            rows.append(wave_row(wave, start, level, texture_bytes))
+            wave = level.current_wave
+            start = WaveCounter(level)
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Texture bytes allocated per wave")
+    parser.add_argument("level", help="level name from level_data.json")
+    parser.add_argument("--plan", help="JSON file with turret actions")
+    parser.add_argument("--max-ticks", type=int, default=10 ** 6,
+                        help="stop after this many ticks")
+    args = parser.parse_args()
+
+    rows = run(args.level, headless.load_plan(args.plan), args.max_ticks)
+
+    print("{:>5} {:>8} {:>12} {:>8} {:>14}".format(
+        "wave", "enemies", "projectiles", "turrets", "copied (est.)"))
+    for row in rows:
+        print("{:>5} {:>8} {:>12} {:>8} {:>14}".format(*row))
+
+    print("[INFO] Copies would take about", sum(row[4] for row in rows),
+          "bytes, shared textures take none")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+
+This module contains memory report which plays a level with scripted
+turret plan up to given wave and prints bytes per entity type measured
+with tracemalloc, together with total memory traced for the level
+
+Usage:
+python3 memoryreport.py "LEVEL 3" --wave 10 --plan plan.json
+
+Surfaces are allocated by SDL and are not seen by tracemalloc, texture
+memory is reported by memorybench.py.
+
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+import numpy as np
+from pygame import Rect
+
+import headless
+from button import Button
+from levelstate import Level, Turret, Enemy
+
+
+# bytes taken by one slot in every array of a pool
+def slot_bytes(pool):
+    return sum(getattr(pool, name).itemsize *
+               int(np.prod(getattr(pool, name).shape[1:]))
+               for name in pool.ARRAYS)
+
+
+# average traced bytes of a new object, objects are returned
+# so they are not freed before measurement ends
+def traced_per_object(create, count=1000):
+    objects = [None] * count
+
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+
+    for idx in range(count):
+        objects[idx] = create()
+
+    after = tracemalloc.get_traced_memory()[0]
+
+    return objects, (after - before) / count
+
+
+def entity_rows(state):
+    level = state.level
+    rows = []
+
+    # pool is grown first so only the views are measured
+    level.enemy_pool.grow(level.enemy_pool.capacity + 1000)
+    enemies, enemy_bytes = traced_per_object(
+        lambda: Enemy(level.spawn_points[0], 0, 1))
+    for enemy in enemies:
+        level.enemy_pool.release(enemy.index)
+    rows.append(("enemy", len(level.enemies), enemy_bytes,
+                 slot_bytes(level.enemy_pool)))
+
+    # projectiles are pool slots only
+    rows.append(("projectile", len(level.projectiles), 0,
+                 slot_bytes(level.projectiles)))
+
+    topleft = level.tiles[0][0].topleft
+    _, turret_bytes = traced_per_object(lambda: Turret(topleft, 0, 0))
+    rows.append(("turret", len(level.turrets), turret_bytes, 0))
+
+    _, button_bytes = traced_per_object(
+        lambda: Button(state.screen, Rect(0, 0, 160, 55), caption="Button"),
+        100)
+    rows.append(("button", len(state.buttons) + 2, button_bytes, 0))
+
+    return rows
+
+
+def run(level_name, plan, wave, max_ticks):
+    resource_manager = headless.init_display()
+
+    tracemalloc.start()
+    gc.collect()
+    baseline = tracemalloc.take_snapshot()
+    baseline_bytes = tracemalloc.get_traced_memory()[0]
+
+    state = headless.make_level_state(resource_manager, level_name)
+    level = state.level
+
+    next_action = 0
+    while (level.finished is False and level.current_wave < wave and
+           level.tick < max_ticks):
+        next_action = headless.apply_due_actions(level, plan, next_action)
+        state.update(Level.TICK)
+        state.draw()
+
+    gc.collect()
+    level_bytes = tracemalloc.get_traced_memory()[0] - baseline_bytes
+    top_files = tracemalloc.take_snapshot().compare_to(baseline, "filename")
+
+    rows = entity_rows(state)
+    tracemalloc.stop()
+
+    return level, level_bytes, top_files, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Bytes per entity type and level footprint")
+    parser.add_argument("level", help="level name from level_data.json")
+    parser.add_argument("--wave", type=int, default=10,
+                        help="play until this wave starts")
+    parser.add_argument("--plan", help="JSON file with turret actions")
+    parser.add_argument("--max-ticks", type=int, default=10 ** 6,
+                        help="stop after this many ticks")
+    args = parser.parse_args()
+
+    level, level_bytes, top_files, rows = run(
+        args.level, headless.load_plan(args.plan), args.wave, args.max_ticks)
+
+    print("[INFO] {} at wave {}, tick {}".format(args.level,
+                                                 level.current_wave,
+                                                 level.tick))
+    print("{:<11} {:>6} {:>13} {:>11} {:>12}".format(
+        "entity", "count", "object bytes", "slot bytes", "total bytes"))
+
+    for name, count, object_bytes, pool_bytes in rows:
+        print("{:<11} {:>6} {:>13.0f} {:>11} {:>12.0f}".format(
+            name, count, object_bytes, pool_bytes,
+            count * (object_bytes + pool_bytes)))
+
+    print("[INFO] Level footprint {} bytes traced".format(level_bytes))
+    for stat in top_files[:5]:
+        print("    {:>10} bytes {}".format(stat.size_diff,
+                                           stat.traceback[0].filename))
+
+
+if __name__ == "__main__":
+    main()
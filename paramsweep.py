@@ -0,0 +1,253 @@
+"""
+
+This module contains parameter sweep runner which runs headless levels
+for every combination of turret plans and stat overrides on all cores
+and streams results to a CSV or JSONL file
+
+Usage:
+python3 paramsweep.py sweep.json --output results.jsonl
+
+Sweep file:
+    {
+        "levels": ["LEVEL 1", "LEVEL 2"],
+        "plans": {"empty": [], "three": "plan.json"},
+        "overrides": {
+            "Turret.COST": [[20, 50, 70], [30, 50, 70]],
+            "Enemy.UPGRADES[2]": [5, 10]
+        },
+        "max_ticks": 200000
+    }
+
+Override keys are "Class.ATTRIBUTE" which replaces whole table or
+"Class.ATTRIBUTE[i]" which replaces only one turret/enemy type.
+Classes which can be overridden are Turret and Enemy. Override keys,
+indices and shapes of values are checked before any run starts, a run
+which fails anyway is written as a row with result "error".
+
+"""
+
+import argparse
+import copy
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import re
+
+import resourcemanager
+import headless
+from levelstate import Turret, Enemy
+
+OVERRIDABLE = {
+    "Turret": (Turret, ("BASE_STATS", "UPGRADES", "UPGRADE_COST", "COST")),
+    "Enemy": (Enemy, ("BASE_STATS", "UPGRADES")),
+}
+
+OVERRIDE_KEY = re.compile(r"^(\w+)\.(\w+)(?:\[(\d+)\])?$")
+
+DEFAULTS = {(name, attribute): copy.deepcopy(getattr(cls, attribute))
+            for name, (cls, attributes) in OVERRIDABLE.items()
+            for attribute in attributes}
+
+worker_resource_manager = None
+
+
+def parse_override_key(key):
+    match = OVERRIDE_KEY.match(key)
+
+    if match is None:
+        raise ValueError("Invalid override key: " + key)
+
+    class_name, attribute, index = match.groups()
+
+    if (class_name not in OVERRIDABLE or
+            attribute not in OVERRIDABLE[class_name][1]):
+        raise ValueError("Attribute can not be overridden: " + key)
+
+    return class_name, attribute, None if index is None else int(index)
+
+
+# value has the same nesting and lengths as default stat
+def matches_stat(value, default):
+    if isinstance(default, (tuple, list)):
+        return (isinstance(value, list) and len(value) == len(default) and
+                all(matches_stat(item, default_item)
+                    for item, default_item in zip(value, default)))
+
+    return (isinstance(value, (int, float)) and
+            not isinstance(value, bool))
+
+
+def check_override(key, values):
+    class_name, attribute, index = parse_override_key(key)
+    default = DEFAULTS[(class_name, attribute)]
+
+    if index is not None:
+        if index >= len(default):
+            raise ValueError("Index out of range in override key: " + key)
+        default = default[index]
+
+    if not isinstance(values, list) or not values:
+        raise ValueError("Override values must be a non-empty list: " + key)
+
+    for value in values:
+        if not matches_stat(value, default):
+            raise ValueError("Override value {} does not match {}".format(
+                json.dumps(value), key))
+
+
+# stats are lists of tuples in code, JSON gives lists
+def as_stat(value):
+    if isinstance(value, list):
+        return tuple(as_stat(item) for item in value)
+    return value
+
+
+def apply_overrides(overrides):
+    for (class_name, attribute), default in DEFAULTS.items():
+        setattr(OVERRIDABLE[class_name][0], attribute, copy.deepcopy(default))
+
+    for key, value in overrides.items():
+        class_name, attribute, index = parse_override_key(key)
+        cls = OVERRIDABLE[class_name][0]
+
+        if index is None:
+            setattr(cls, attribute, [as_stat(item) for item in value])
+        else:
+            getattr(cls, attribute)[index] = as_stat(value)
+
+
+def load_sweep(path):
+    with open(path, "r") as json_file:
+        sweep = json.load(json_file)
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    plans = {}
+    for name, plan in sweep.get("plans", {"empty": []}).items():
+        if isinstance(plan, str):
+            plan = headless.load_plan(os.path.join(base_dir, plan))
+        plans[name] = plan
+
+    for key, values in sweep.get("overrides", {}).items():
+        check_override(key, values)
+
+    return sweep, plans
+
+
+def make_configurations(sweep, plans):
+    override_keys = sorted(sweep.get("overrides", {}))
+    override_values = [sweep["overrides"][key] for key in override_keys]
+
+    grid = itertools.product(sweep["levels"], sorted(plans),
+                             itertools.product(*override_values))
+
+    for run_id, (level_name, plan_name, values) in enumerate(grid):
+        yield {
+            "id": run_id,
+            "level": level_name,
+            "plan_name": plan_name,
+            "plan": plans[plan_name],
+            "overrides": dict(zip(override_keys, values)),
+            "max_ticks": sweep.get("max_ticks"),
+        }
+
+
+def init_worker():
+    global worker_resource_manager
+    worker_resource_manager = resourcemanager.ResourceManager(
+        load_textures=False)
+
+
+# failed run gives a row with its error so the sweep goes on
+def run_configuration(configuration):
+    result = {"id": configuration["id"], "plan": configuration["plan_name"]}
+    result.update(configuration["overrides"])
+
+    try:
+        apply_overrides(configuration["overrides"])
+        stats = headless.run_level(worker_resource_manager,
+                                   configuration["level"],
+                                   configuration["plan"],
+                                   configuration["max_ticks"])
+    except Exception as error:
+        stats = {"level": configuration["level"], "result": "error",
+                 "error": repr(error)}
+
+    result.update(stats)
+
+    return result
+
+
+class ResultWriter:
+    """
+
+    Writes every result as soon as it arrives, format is taken from
+    output file extension.
+
+    """
+
+    def __init__(self, path, override_keys):
+        self.file = open(path, "w", newline="")
+        self.csv_writer = None
+
+        if path.endswith(".csv"):
+            fields = (["id", "plan"] + override_keys +
+                      ["level", "result", "waves_survived", "max_wave",
+                       "money", "health", "turrets", "ticks", "seconds",
+                       "ticks_per_second", "error"])
+            self.csv_writer = csv.DictWriter(self.file, fields)
+            self.csv_writer.writeheader()
+
+    def write(self, result):
+        if self.csv_writer is None:
+            self.file.write(json.dumps(result) + "\n")
+        else:
+            self.csv_writer.writerow({
+                key: json.dumps(value) if isinstance(value, list) else value
+                for key, value in result.items()})
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run headless levels for a grid of plans and stats")
+    parser.add_argument("sweep", help="JSON file describing the grid")
+    parser.add_argument("--output", default="sweep_results.jsonl",
+                        help="result file, .csv or .jsonl")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of processes")
+    args = parser.parse_args()
+
+    sweep, plans = load_sweep(args.sweep)
+
+    level_data = resourcemanager.ResourceManager(
+        load_textures=False).level_data
+    for level_name in sweep["levels"]:
+        if level_name not in level_data:
+            parser.error("unknown level " + repr(level_name))
+
+    configurations = make_configurations(sweep, plans)
+    writer = ResultWriter(args.output, sorted(sweep.get("overrides", {})))
+
+    done = 0
+    with multiprocessing.Pool(args.workers, init_worker) as pool:
+        for result in pool.imap_unordered(run_configuration, configurations,
+                                          chunksize=4):
+            writer.write(result)
+            if result["result"] == "error":
+                print("[INFO] Run", result["id"], "failed:", result["error"])
+            done += 1
+            if done % 100 == 0:
+                print("[INFO] Finished", done, "runs")
+
+    writer.close()
+    print("[INFO] Finished", done, "runs, results in", args.output)
+
+
+if __name__ == "__main__":
+    main()
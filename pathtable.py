@@ -0,0 +1,69 @@
+"""
+
+This module contains class PathTable which is responsible for turning
+distance travelled along a level route into a position on the map
+
+"""
+
+import numpy as np
+
+
+class PathTable:
+    """
+
+    Cumulative arc length of all level routes computed once per level.
+    Routes are laid one after another on a single distance axis so
+    position on any route is found with one binary search and any
+    step size is handled.
+
+    """
+
+    # routes in form of (start tile topleft corner, paths), paths in form
+    # of (direction, length, end_tile topleft corner)
+    def __init__(self, routes, half_size):
+        directions = []
+        starts = []
+        cumulative = []
+        offsets = []
+        lengths = []
+
+        offset = 0
+        for start, paths in routes:
+            point = (start[0] + half_size, start[1] + half_size)
+
+            # route which starts on its end tile
+            if not paths:
+                paths = [((0, 0), 0, start)]
+
+            offsets.append(offset)
+            passed = 0
+
+            for direction, length, end in paths:
+                directions.append(direction)
+                starts.append(point)
+                cumulative.append(offset + passed)
+
+                passed += length
+                point = (end[0] + half_size, end[1] + half_size)
+
+            lengths.append(passed)
+            # gap keeps end of a route away from start of the next one
+            offset += passed + 1
+
+        self.directions = np.array(directions, dtype=np.float64)
+        self.starts = np.array(starts, dtype=np.float64)
+        # cumulative[i] is distance at which segment i starts
+        self.cumulative = np.array(cumulative, dtype=np.float64)
+        self.offsets = np.array(offsets, dtype=np.float64)
+        self.lengths = np.array(lengths, dtype=np.float64)
+
+    def segment(self, key):
+        return np.searchsorted(self.cumulative, key, side="right") - 1
+
+    def positions(self, distance, route):
+        distance = np.minimum(distance, self.lengths[route])
+        key = self.offsets[route] + distance
+
+        segment = self.segment(key)
+        return (self.starts[segment] + self.directions[segment] *
+                (key - self.cumulative[segment])[..., None])
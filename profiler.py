@@ -0,0 +1,160 @@
+"""
+
+This module contains class FrameProfiler which is responsible for
+measuring time spent in each phase of a frame, drawing overlay with
+frame statistics and saving frame trace to CSV file
+
+"""
+
+import csv
+import time
+
+import numpy as np
+from pygame.surface import Surface
+from textcache import text_cache
+
+
+class FrameProfiler:
+    """
+
+    Phase timings and entity counts of the last frames are kept in a
+    ring buffer, one row per frame.
+
+    """
+
+    PHASES = ("event_loop", "update", "turrets", "projectiles", "spawner",
+              "enemies", "draw", "display")
+    COUNTS = ("ticks", "enemy_count", "projectile_count", "turret_count",
+              "enemy_high_water", "enemy_reuse", "projectile_high_water",
+              "projectile_reuse", "reclaimed_enemies",
+              "reclaimed_projectiles", "chunks_rendered", "chunk_bytes")
+    COLUMNS = ("frame",) + PHASES + COUNTS
+
+    OVERLAY_REFRESH = 0.25
+
+    def __init__(self, size=2048):
+        self.size = size
+        self.rows = np.zeros((size, len(FrameProfiler.COLUMNS)))
+        self.frames = 0
+
+        self.column = {name: idx for idx, name
+                       in enumerate(FrameProfiler.COLUMNS)}
+        self.current = np.zeros(len(FrameProfiler.COLUMNS))
+        self.started = {}
+        self.frame_start = None
+
+        self.overlay = False
+        self.overlay_surface = None
+        self.overlay_time = 0
+
+    def start(self, phase):
+        self.started[phase] = time.perf_counter()
+
+    # phases can be measured many times per frame, times are summed
+    def stop(self, phase):
+        self.current[self.column[phase]] += (time.perf_counter() -
+                                             self.started[phase])
+
+    def count(self, name, value):
+        self.current[self.column[name]] += value
+
+    def end_frame(self):
+        now = time.perf_counter()
+
+        if self.frame_start is not None:
+            self.current[0] = now - self.frame_start
+            self.rows[self.frames % self.size] = self.current
+            self.frames += 1
+
+        self.frame_start = now
+        self.current = np.zeros(len(FrameProfiler.COLUMNS))
+
+    def recorded(self):
+        if self.frames <= self.size:
+            return self.rows[:self.frames]
+
+        # oldest frame first
+        split = self.frames % self.size
+        return np.concatenate((self.rows[split:], self.rows[:split]))
+
+    def statistics(self):
+        rows = self.recorded()
+
+        if len(rows) == 0:
+            return None
+
+        frame_times = rows[:, 0]
+        phases = rows[:, 1:1 + len(FrameProfiler.PHASES)].mean(axis=0)
+
+        return {
+            "fps": len(frame_times) / frame_times.sum(),
+            "p50": np.percentile(frame_times, 50),
+            "p99": np.percentile(frame_times, 99),
+            "phases": dict(zip(FrameProfiler.PHASES, phases)),
+            "counts": dict(zip(FrameProfiler.COUNTS,
+                               rows[-1, 1 + len(FrameProfiler.PHASES):])),
+        }
+
+    def toggle_overlay(self):
+        self.overlay ^= True
+        self.overlay_surface = None
+
+    def overlay_lines(self):
+        stats = self.statistics()
+
+        if stats is None:
+            return ["no frames recorded"]
+
+        lines = ["FPS {:.0f}  p50 {:.2f} ms  p99 {:.2f} ms".format(
+            stats["fps"], stats["p50"] * 1000, stats["p99"] * 1000)]
+
+        for phase, seconds in stats["phases"].items():
+            lines.append("{} {:.2f} ms".format(phase, seconds * 1000))
+
+        lines.append("ticks {ticks:.0f}  enemies {enemy_count:.0f}  "
+                     "projectiles {projectile_count:.0f}  "
+                     "turrets {turret_count:.0f}".format(**stats["counts"]))
+        lines.append("pools: enemies peak {enemy_high_water:.0f} reused "
+                     "{enemy_reuse:.0%}  projectiles peak "
+                     "{projectile_high_water:.0f} reused "
+                     "{projectile_reuse:.0%}".format(**stats["counts"]))
+        lines.append("reclaimed last wave: enemies {reclaimed_enemies:.0f}  "
+                     "projectiles {reclaimed_projectiles:.0f}".format(
+                         **stats["counts"]))
+        lines.append("map chunks rendered {chunks_rendered:.0f}  cached "
+                     "{chunk_bytes:.0f} bytes".format(**stats["counts"]))
+        lines.append("text cache {} hits {} misses".format(
+            text_cache.hits, text_cache.misses))
+
+        return lines
+
+    # returns rect covered by overlay
+    def draw_overlay(self, screen, font):
+        now = time.perf_counter()
+
+        if (self.overlay_surface is None or
+                now - self.overlay_time > FrameProfiler.OVERLAY_REFRESH):
+            self.overlay_time = now
+
+            lines = [font.render(line, True, (255, 255, 0))
+                     for line in self.overlay_lines()]
+            width = max(line.get_width() for line in lines) + 10
+            height = sum(line.get_height() for line in lines) + 10
+
+            self.overlay_surface = Surface((width, height))
+            y = 5
+            for line in lines:
+                self.overlay_surface.blit(line, (5, y))
+                y += line.get_height()
+
+        return screen.blit(self.overlay_surface, (0, 0))
+
+    def dump_csv(self, path):
+        with open(path, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(FrameProfiler.COLUMNS)
+            writer.writerows(self.recorded().tolist())
+
+
+# shared by state machine and level simulation
+frame_profiler = FrameProfiler()
@@ -0,0 +1,93 @@
+"""
+
+This module contains class ProjectilePool which is responsible for
+storing projectiles in NumPy arrays, moving them towards their targets
+and resolving hits for all projectiles at once
+
+"""
+
+import numpy as np
+
+from slotpool import SlotPool
+
+
+class ProjectilePool(SlotPool):
+    """
+
+    Targets are EnemyPool slots together with the slot generation
+    from the moment of shooting, so projectiles never follow an enemy
+    which took over a released slot.
+
+    """
+
+    FIELDS = (("position", np.float64, 2),
+              ("previous_position", np.float64, 2),
+              ("target", np.int64, 0),
+              ("target_generation", np.int64, 0),
+              ("dmg", np.int64, 0),
+              ("speed", np.float64, 0),
+              ("projectile_type", np.int64, 0),
+              ("active", bool, 0))
+
+    def __init__(self, enemy_pool, hit_radius=15, capacity=256):
+        self.enemy_pool = enemy_pool
+        self.hit_radius = hit_radius
+
+        super().__init__(capacity)
+
+    def spawn(self, center, projectile_type, target, target_generation, dmg,
+              speed):
+        idx = self.allocate()
+
+        self.position[idx] = center
+        self.previous_position[idx] = center
+        self.target[idx] = target
+        self.target_generation[idx] = target_generation
+        self.dmg[idx] = dmg
+        self.speed[idx] = speed
+        self.projectile_type[idx] = projectile_type
+        self.active[idx] = True
+
+        return idx
+
+    def release(self, indices):
+        self.active[indices] = False
+        self.free_slots(indices.tolist())
+
+    # returns number of freed slots
+    def update(self, dt):
+        self.previous_position[:] = self.position
+
+        idx = np.flatnonzero(self.active)
+
+        if idx.size == 0:
+            return 0
+
+        enemy_pool = self.enemy_pool
+        target = self.target[idx]
+
+        # target died or its slot was reused
+        valid = ((enemy_pool.generation[target] ==
+                  self.target_generation[idx]) & enemy_pool.alive[target])
+
+        orphaned = idx[~valid]
+        idx = idx[valid]
+        target = target[valid]
+
+        delta = enemy_pool.position[target] - self.position[idx]
+        distance = np.sqrt(delta[:, 0] ** 2 + delta[:, 1] ** 2)
+
+        # projectiles which would reach the hit radius during this tick
+        # hit now instead of flying past the target
+        travel = dt * self.speed[idx]
+        hit = distance <= self.hit_radius + travel
+        np.subtract.at(enemy_pool.hp, target[hit], self.dmg[idx[hit]])
+
+        flying = ~hit
+        step = travel[flying] / distance[flying]
+        self.position[idx[flying]] += delta[flying] * step[:, None]
+
+        self.release(orphaned)
+        self.release(idx[hit])
+
+        return orphaned.size + int(np.count_nonzero(hit))
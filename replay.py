@@ -0,0 +1,121 @@
+"""
+
+This module contains class Replay which is responsible for recording
+player actions together with simulation tick into a compact binary
+file and playing them back on a level without rendering
+
+File starts with magic, version and level name followed by fixed size
+records (tick, action, tile_id, value), value is turret type for place,
+index of targeting mode for target and speed multiplier in hundredths
+for speed.
+
+"""
+
+import struct
+
+
+class Replay:
+    """
+
+    Actions in form of (tick, action, tile_id, value) in order they
+    were made.
+
+    """
+
+    MAGIC = b"TDRP"
+    VERSION = 1
+
+    HEADER = struct.Struct("<4sBH")
+    RECORD = struct.Struct("<IBHH")
+
+    ACTIONS = ("place", "upgrade", "sell", "speed", "target")
+    PLACE, UPGRADE, SELL, SPEED, TARGET = range(len(ACTIONS))
+
+    def __init__(self, level_name, actions=None):
+        self.level_name = level_name
+        self.actions = [] if actions is None else actions
+
+    def record(self, tick, action, tile_id=0, value=0):
+        self.actions.append((tick, action, tile_id, value))
+
+    def record_speed(self, tick, speed_multiplier):
+        self.record(tick, Replay.SPEED, 0, round(speed_multiplier * 100))
+
+    def save(self, path):
+        name = self.level_name.encode("utf-8")
+
+        with open(path, "wb") as replay_file:
+            replay_file.write(Replay.HEADER.pack(Replay.MAGIC, Replay.VERSION,
+                                                 len(name)))
+            replay_file.write(name)
+            replay_file.write(b"".join(Replay.RECORD.pack(*action)
+                                       for action in self.actions))
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as replay_file:
+            data = replay_file.read()
+
+        magic, version, name_length = Replay.HEADER.unpack_from(data)
+
+        if magic != Replay.MAGIC:
+            raise ValueError(path + " is not a replay file")
+        if version != Replay.VERSION:
+            raise ValueError("Unsupported replay version " + str(version))
+
+        offset = Replay.HEADER.size
+        level_name = data[offset:offset + name_length].decode("utf-8")
+        offset += name_length
+
+        return Replay(level_name,
+                      list(Replay.RECORD.iter_unpack(data[offset:])))
+
+    # returns speed multiplier after action
+    @staticmethod
+    def apply(level, record, speed_multiplier):
+        _, action, tile_id, value = record
+
+        if action == Replay.SPEED:
+            return value / 100
+
+        if action == Replay.PLACE:
+            level.place_turret(tile_id, value)
+            return speed_multiplier
+
+        turret = level.get_turret(tile_id)
+        if turret is None:
+            return speed_multiplier
+
+        if action == Replay.UPGRADE:
+            level.upgrade_turret(turret)
+        elif action == Replay.SELL:
+            level.sell_turret(turret)
+        elif action == Replay.TARGET:
+            level.set_targeting(turret, value)
+        else:
+            raise ValueError("Unknown replay action: " + str(action))
+
+        return speed_multiplier
+
+    # runs level at maximum speed up to given tick, actions made on that
+    # tick are applied as well, returns speed multiplier and replay of
+    # applied actions so recording can go on from there
+    def play(self, level, until_tick=None):
+        speed_multiplier = 1
+        next_action = 0
+
+        while True:
+            while (next_action < len(self.actions) and
+                   self.actions[next_action][0] <= level.tick):
+                speed_multiplier = Replay.apply(
+                    level, self.actions[next_action], speed_multiplier)
+                next_action += 1
+
+            if level.finished or (until_tick is not None and
+                                  level.tick >= until_tick):
+                break
+
+            level.step()
+
+        return speed_multiplier, Replay(self.level_name,
+                                        self.actions[:next_action])
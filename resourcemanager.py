@@ -6,20 +6,96 @@ reading game date from files and storing information
 """
 
 import json
-from pygame import image as img
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pygame import font
+from pygame import transform
+import textureatlas
+
+# files are read and decoded here, surfaces are converted on the main
+# thread when they are first used
+loader = ThreadPoolExecutor()
 
 
 class ResourceManager:
     """
 
+    Resources start loading in background when manager is created and
+    are waited for on first use.
+
     """
 
-    def __init__(self):
+    TEXTURE_DATA = "resources/texture_data.json"
+    TEXTURE_DIR = "resources/textures"
+
+    def __init__(self, load_textures=True):
+
+        # seconds spent loading each resource, keyed like the registries
+        self.load_times = {}
+        self.fonts = {}
+        self.font_requests = 0
+        self.zoomed = {}
+
+        # resources in form of (future, finish), finish runs on first use
+        self.pending = {}
+        self.loaded = {}
+        # source key of loaded atlas
+        self.atlas_key = None
+
+        self.request("level_data", self.load_data,
+                     "resources/level_data.json")
+        self.request("maps", self.load_data, "resources/maps.json")
+        self.request("wave_schedule", self.load_data,
+                     "resources/wave_schedule.json")
+
+        # textures need display mode to be set, headless runs skip them
+        if load_textures:
+            self.request("textures", self.read_textures,
+                         finish=self.finish_textures)
+        else:
+            self.loaded["textures"] = {}
+
+    @property
+    def level_data(self):
+        return self.get("level_data")
+
+    @property
+    def maps(self):
+        return self.get("maps")
+
+    @property
+    def wave_schedule(self):
+        return self.get("wave_schedule")
+
+    @property
+    def textures(self):
+        return self.get("textures")
+
+    # game is drawn on 1280x768 screen blitted unscaled into the window,
+    # so textures are drawn at their size
+    @property
+    def scaled_textures(self):
+        return self.textures
+
+    # identifies files textures were made from
+    def texture_key(self):
+        self.get("textures")
+        return self.atlas_key
 
-        self.level_data = self.load_data("resources/level_data.json")
-        self.textures = self.load_textures("resources/texture_data.json")
-        self.maps = self.load_data("resources/maps.json")
-        self.scaled_textures = self.textures.copy()
+    def request(self, name, load, *args, finish=None):
+        self.pending[name] = (loader.submit(load, *args), finish)
+
+    def get(self, name):
+        if name not in self.loaded:
+            start = time.perf_counter()
+            future, finish = self.pending.pop(name)
+
+            value = future.result()
+            self.loaded[name] = value if finish is None else finish(*value)
+            # only time spent waiting on the main thread is counted
+            self.load_times[name] = time.perf_counter() - start
+
+        return self.loaded[name]
 
     def load_data(self, path):
         data = None
@@ -27,15 +103,54 @@ class ResourceManager:
             data = json.load(json_file)
         return data
 
-    def load_textures(self, path):
-        texture_data = None
-        with open(path, "r") as json_file:
-            texture_data = json.load(json_file)
+    # runs on loader thread, cached atlas is decoded there as well
+    def read_textures(self):
+        names = self.load_data(ResourceManager.TEXTURE_DATA)
+        key, cached = textureatlas.read_cached(
+            names, ResourceManager.TEXTURE_DIR, 1)
+
+        return names, key, cached
+
+    # all textures are subsurfaces of one atlas cached on disk
+    def finish_textures(self, names, key, cached):
+        self.atlas_key = key
+        return textureatlas.finish(names, ResourceManager.TEXTURE_DIR, 1,
+                                   key, cached, loader)
+
+    # fonts are loaded once and shared, they must not be modified
+    def get_font(self, path, size):
+        self.font_requests += 1
+        key = (path, size)
+
+        if key not in self.fonts:
+            start = time.perf_counter()
+            self.fonts[key] = font.Font(path, size)
+            self.load_times[key] = time.perf_counter() - start
+
+        return self.fonts[key]
+
+    # time waited for every resource loaded so far
+    def report_loading(self):
+        for key, seconds in self.load_times.items():
+            if isinstance(key, tuple):
+                key = "font {} {}".format(*key)
+            print("[INFO] Loading {} took {:.3f} s".format(key, seconds))
+
+        print("[INFO] {} fonts loaded for {} requests".format(
+            len(self.fonts), self.font_requests))
+
+    # textures are shared by all entities and must not be modified,
+    # texture resized for camera zoom is made once per (name, zoom)
+    def get_scaled(self, name, zoom):
+        texture = self.scaled_textures[name]
 
-        textures = {}
+        if zoom == 1:
+            return texture
 
-        for name in texture_data:
-            textures[name] = img.load("resources/textures/" +
-                                      name + ".png").convert_alpha()
+        key = (name, zoom)
+        if key not in self.zoomed:
+            self.zoomed[key] = transform.smoothscale(
+                texture, (max(round(texture.get_width() * zoom), 1),
+                          max(round(texture.get_height() * zoom), 1)))
 
-        return textures
+        return self.zoomed[key]
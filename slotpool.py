@@ -0,0 +1,108 @@
+"""
+
+This module contains class SlotPool which is responsible for handing
+out and growing slots of NumPy structure of arrays pools and for their
+stats and snapshots
+
+"""
+
+import numpy as np
+
+
+class SlotPool:
+    """
+
+    Base of pools storing one entity per slot. Subclasses declare FIELDS
+    in form of (name, dtype, columns), columns of 0 make a flat array,
+    and fill the slot returned by allocate. Pools with position and
+    previous_position fields can be drawn with render_positions.
+
+    """
+
+    FIELDS = ()
+    COUNTERS = ("spawned", "live", "high_water", "slots_used")
+
+    # ARRAYS are names of FIELDS in the same order
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.ARRAYS = tuple(name for name, dtype, columns in cls.FIELDS)
+
+    def __init__(self, capacity):
+        self.capacity = 0
+        for name, dtype, columns in self.FIELDS:
+            shape = (0, columns) if columns else 0
+            setattr(self, name, np.zeros(shape, dtype=dtype))
+
+        self.free = []
+        self.spawned = 0
+
+        # pool stats, slots are handed out from the lowest so every slot
+        # below slots_used was taken before
+        self.live = 0
+        self.high_water = 0
+        self.slots_used = 0
+
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        extra = capacity - self.capacity
+
+        if extra <= 0:
+            return
+
+        for name in self.ARRAYS:
+            array = getattr(self, name)
+            padding = np.zeros((extra,) + array.shape[1:], dtype=array.dtype)
+            setattr(self, name, np.concatenate((array, padding)))
+
+        # lowest slots are handed out first
+        self.free.extend(reversed(range(self.capacity, capacity)))
+        self.capacity = capacity
+
+    # returns free slot, pool doubles when it is full
+    def allocate(self):
+        if not self.free:
+            self.grow(max(2 * self.capacity, 1))
+
+        idx = self.free.pop()
+        self.spawned += 1
+        self.live += 1
+        self.high_water = max(self.high_water, self.live)
+        self.slots_used = max(self.slots_used, idx + 1)
+
+        return idx
+
+    # slots in form of list of indices
+    def free_slots(self, indices):
+        self.free.extend(indices)
+        self.live -= len(indices)
+
+    def __len__(self):
+        return self.live
+
+    # copies of all arrays, used for level snapshots
+    def snapshot(self):
+        data = {name: getattr(self, name).copy() for name in self.ARRAYS}
+        data["free"] = np.array(self.free, dtype=np.int64)
+        for name in SlotPool.COUNTERS:
+            data[name] = np.array(getattr(self, name))
+        return data
+
+    def restore(self, data):
+        for name in self.ARRAYS:
+            setattr(self, name, data[name].copy())
+
+        self.capacity = len(data[self.ARRAYS[0]])
+        self.free = data["free"].tolist()
+        for name in SlotPool.COUNTERS:
+            setattr(self, name, int(data[name]))
+
+    def stats(self):
+        reused = self.spawned - self.slots_used
+        return {"high_water": self.high_water,
+                "reuse_rate": reused / self.spawned if self.spawned else 0}
+
+    # positions between the last two ticks used for drawing
+    def render_positions(self, indices, interpolation):
+        previous = self.previous_position[indices]
+        return previous + (self.position[indices] - previous) * interpolation
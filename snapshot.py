@@ -0,0 +1,46 @@
+"""
+
+This module contains functions which are responsible for writing level
+snapshots to disk in a background thread and reading them back
+
+Snapshot is a NumPy .npz archive of arrays made by LevelState.snapshot,
+so nothing is pickled. VERSION has to be bumped whenever layout of the
+arrays changes, snapshots of other versions are refused.
+
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+VERSION = 4
+
+# single worker keeps saves in order
+writer = ThreadPoolExecutor(max_workers=1)
+
+
+def write(data, path):
+    temporary_path = path + ".tmp"
+
+    with open(temporary_path, "wb") as snapshot_file:
+        np.savez(snapshot_file, version=np.array(VERSION), **data)
+
+    # half written snapshot never replaces the previous one
+    os.replace(temporary_path, path)
+
+
+# data has to be a copy, it is written after the frame goes on
+def save(data, path):
+    return writer.submit(write, data, path)
+
+
+def load(path):
+    with np.load(path, allow_pickle=False) as archive:
+        data = dict(archive)
+
+    version = int(data.pop("version", -1))
+    if version != VERSION:
+        raise ValueError("Unsupported snapshot version " + str(version))
+
+    return data
@@ -0,0 +1,93 @@
+"""
+
+This module contains class SpatialHash which is responsible for
+bucketing enemies into map tiles so turrets can find targets
+without scanning every enemy
+
+"""
+
+from math import floor, sqrt
+
+import numpy as np
+
+
+class SpatialHash:
+    """
+
+    Uniform grid with one cell per map tile, built from enemy pool
+    arrays at once. Enemies are sorted by cell and kept in enemies list
+    order inside a cell so ties can be resolved the same way as a
+    linear scan. Cells of one map row are next to each other, so every
+    row of a query is a single slice.
+
+    """
+
+    def __init__(self, cell_size, columns, rows):
+        self.cell_size = cell_size
+        self.columns = columns
+        self.rows = rows
+        self.clear()
+
+    def clear(self):
+        self.enemies = []
+        # positions in enemies list sorted by cell, cell i holds
+        # order[starts[i]:starts[i + 1]]
+        self.order = []
+        self.starts = np.zeros(self.columns * self.rows + 1, dtype=np.int64)
+
+    def rebuild(self, enemies, pool):
+        self.enemies = enemies
+
+        slots = np.fromiter((enemy.index for enemy in enemies),
+                            dtype=np.int64, count=len(enemies))
+        listed = np.flatnonzero(pool.alive[slots])
+
+        cells = self.cell_ids(pool.position[slots[listed]])
+        # stable sort keeps enemies list order inside a cell
+        by_cell = np.argsort(cells, kind="stable")
+
+        self.order = listed[by_cell].tolist()
+        self.starts[0] = 0
+        np.cumsum(np.bincount(cells, minlength=self.columns * self.rows),
+                  out=self.starts[1:])
+
+    # points in form of NumPy array of (x, y) rows
+    def cell_ids(self, points):
+        cells = (points // self.cell_size).astype(np.int64)
+        np.clip(cells, 0, (self.columns - 1, self.rows - 1), out=cells)
+        return cells[:, 1] * self.columns + cells[:, 0]
+
+    # yields (position in enemies list, enemy) from cells touching
+    # the circle
+    def query(self, center, radius):
+        size = self.cell_size
+        x, y = center
+
+        first_row = max(int(floor((y - radius) / size)), 0)
+        last_row = min(int(floor((y + radius) / size)), self.rows - 1)
+
+        radius_sq = radius * radius
+        enemies = self.enemies
+        order = self.order
+        starts = self.starts
+
+        for row in range(first_row, last_row + 1):
+            top = row * size
+            dy = max(top - y, 0, y - top - size)
+
+            if dy * dy > radius_sq:
+                continue
+
+            # cells whose closest point is inside of the circle
+            reach = sqrt(radius_sq - dy * dy)
+            first_column = max(int(floor((x - reach) / size)), 0)
+            last_column = min(int(floor((x + reach) / size)),
+                              self.columns - 1)
+
+            if first_column > last_column:
+                continue
+
+            cell = row * self.columns
+            for idx in order[starts[cell + first_column]:
+                             starts[cell + last_column + 1]]:
+                yield idx, enemies[idx]
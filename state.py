@@ -23,6 +23,7 @@ class State:
     def update(self, dt):
         raise NotImplementedError()
 
+    # returns list of changed rects or None when whole screen changed
     def draw(self):
         raise NotImplementedError()
 
@@ -34,3 +35,7 @@ class State:
 
     def startup(self, *args):
         pass
+
+    # numbers of entities shown by profiler overlay
+    def entity_counts(self):
+        return {}
@@ -5,53 +5,125 @@ states and running game
 
 """
 
+import os
+import time
+import zipfile
 import pygame as pg
 import resourcemanager
 from menustate import MenuState
 from levelselectstate import LevelSelectState
 from levelstate import LevelState
+from button import Button
 from pygame.surface import Surface
+from profiler import frame_profiler
+from replay import Replay
+import snapshot
 
 
 class StateMachine:
     SCREEN_SIZE = (1280, 768)
     FPS = 144
-
-    def __init__(self, screen):
+    SAVE_PATH = "savegame.npz"
+
+    # states are created when they are first entered
+    STATES = {"menu": MenuState,
+              "levelselect": LevelSelectState,
+              "level": LevelState}
+
+    # start_time is when the game started, first frame is timed from it
+    def __init__(self, screen, trace_path=None, record_path=None,
+                 start_time=None):
+        self.start_time = (time.perf_counter() if start_time is None
+                           else start_time)
+        self.first_frame_time = None
         self.quit = False
+        self.trace_path = trace_path
+        self.record_path = record_path
         self.done = False
         self.screen = screen
         self.clock = pg.time.Clock()
         self.next_lvl = "level1"
 
         self.resource_manager = resourcemanager.ResourceManager()
+        Button.init(self.resource_manager)
+        self.overlay_font = self.resource_manager.get_font(
+            "resources/arial.ttf", 14)
+
+        self.states = {}
+        self.state = self.get_state("menu")
+
+    def get_state(self, name):
+        if name not in self.states:
+            self.states[name] = StateMachine.STATES[name](
+                Surface(StateMachine.SCREEN_SIZE), self.resource_manager)
+
+            if name == "level":
+                self.states[name].save_path = StateMachine.SAVE_PATH
+                self.load_snapshot()
+
+        return self.states[name]
 
-        self.states = {"menu": MenuState(Surface(
-                                         StateMachine.SCREEN_SIZE),
-                                         self.resource_manager),
+    # saved level is what "continue" in menu goes back to, it is loaded
+    # when level state is first needed, save which can not be restored
+    # is removed so it does not break next starts
+    def load_snapshot(self):
+        if not os.path.exists(StateMachine.SAVE_PATH):
+            return
+
+        level_state = self.states["level"]
+
+        try:
+            data = snapshot.load(StateMachine.SAVE_PATH)
+            level_state.restore(Surface(StateMachine.SCREEN_SIZE), data)
+        except (OSError, ValueError, KeyError, IndexError,
+                zipfile.BadZipFile) as error:
+            print("[INFO] Snapshot not loaded:", repr(error))
+            level_state.level = None
+
+            try:
+                os.remove(StateMachine.SAVE_PATH)
+            except OSError:
+                pass
+            return
 
-                       "levelselect": LevelSelectState(Surface(
-                                         StateMachine.SCREEN_SIZE),
-                                         self.resource_manager),
+        print("[INFO] Snapshot of", level_state.level_name, "loaded")
 
-                       "level": LevelState(Surface(
-                                    StateMachine.SCREEN_SIZE),
-                                    self.resource_manager),
-                       }
+    # starts level from replay file, recorded part is simulated
+    # without drawing
+    def play_replay(self, path, until_tick=None):
+        replay = Replay.load(path)
+        level_state = self.get_state("level")
 
-        self.state = self.states["menu"]
+        level_state.startup(Surface(StateMachine.SCREEN_SIZE),
+                            replay.level_name)
+        level_state.fast_forward(replay, until_tick)
+
+        print("[INFO] Replay", path, "played to tick",
+              level_state.level.tick)
+        self.state = level_state
+
+    def save_replay(self):
+        if self.record_path is None or self.state.name != "level":
+            return
+
+        self.state.replay.save(self.record_path)
+        print("[INFO] Replay saved to", self.record_path)
 
     def change_state(self):
+        self.save_replay()
+        if self.state.name == "level":
+            self.state.save()
         self.state.done = False
 
         if self.state.next is None:
             self.quit = True
             return
 
-        self.states[self.state.next].startup(Surface(StateMachine.SCREEN_SIZE),
-                                             *self.state.next_state_args)
+        next_state = self.get_state(self.state.next)
+        next_state.startup(Surface(StateMachine.SCREEN_SIZE),
+                           *self.state.next_state_args)
 
-        self.state = self.states[self.state.next]
+        self.state = next_state
 
     def update(self, dt):
         if self.state.quit:
@@ -66,21 +138,84 @@ class StateMachine:
             if event.type == pg.QUIT:
                 self.quit = True
 
+            if event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                frame_profiler.toggle_overlay()
+                self.redraw = True
+
             self.state.process_event(event)
 
     def main_loop(self):
+        self.redraw = True
+        self.last_overlay = pg.Rect(0, 0, 0, 0)
+
         while not self.quit:
-            self.screen.fill((0, 0, 0))
             delta_time = self.clock.tick(StateMachine.FPS)/1000.0
+            frame_profiler.end_frame()
 
+            frame_profiler.start("event_loop")
             self.event_loop()
+            frame_profiler.stop("event_loop")
+
+            state = self.state
+
+            frame_profiler.start("update")
             self.update(delta_time)
+            frame_profiler.stop("update")
+
+            frame_profiler.start("draw")
+            dirty_rects = self.state.draw()
+            frame_profiler.stop("draw")
 
-            self.state.draw()
-            self.screen.blit(self.state.screen, (0, 0))
+            # state changed during update, its screen was not drawn before
+            if state is not self.state or self.redraw:
+                dirty_rects = None
+                self.redraw = False
 
             if self.state.quit:
                 self.quit = True
 
-            pg.display.update()
-            self.clock.tick(StateMachine.FPS)
+            frame_profiler.start("display")
+            if dirty_rects is None:
+                self.screen.fill((0, 0, 0))
+                self.screen.blit(self.state.screen, (0, 0))
+            else:
+                for rect in dirty_rects:
+                    self.screen.blit(self.state.screen, rect, rect)
+
+            if frame_profiler.overlay:
+                # overlay size changes, old one is covered by state screen
+                if dirty_rects is not None:
+                    self.screen.blit(self.state.screen, self.last_overlay,
+                                     self.last_overlay)
+                    dirty_rects.append(self.last_overlay)
+
+                self.last_overlay = frame_profiler.draw_overlay(
+                    self.screen, self.overlay_font)
+
+                if dirty_rects is not None:
+                    dirty_rects.append(self.last_overlay)
+
+            if dirty_rects is None:
+                pg.display.update()
+            else:
+                pg.display.update(dirty_rects)
+            frame_profiler.stop("display")
+
+            if self.first_frame_time is None:
+                self.first_frame_time = time.perf_counter() - self.start_time
+                print("[INFO] First frame after {:.3f} s".format(
+                    self.first_frame_time))
+                self.resource_manager.report_loading()
+
+            for name, value in self.state.entity_counts().items():
+                frame_profiler.count(name, value)
+
+        self.save_replay()
+        if self.state.name == "level":
+            self.state.save()
+        # pending snapshot is written before the game closes
+        snapshot.writer.shutdown(wait=True)
+
+        if self.trace_path is not None:
+            frame_profiler.dump_csv(self.trace_path)
+            print("[INFO] Frame trace saved to", self.trace_path)
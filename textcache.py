@@ -0,0 +1,53 @@
+"""
+
+This module contains class TextCache which is responsible for
+keeping rendered text surfaces so the same text is not rasterized
+again every frame
+
+"""
+
+from collections import OrderedDict
+
+
+class TextCache:
+    """
+
+    Least recently used cache of font.render results keyed by
+    (font, text, antialias, color).
+
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, antialias, tuple(color))
+        surface = self.surfaces.get(key)
+
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+
+# shared by all states and buttons
+text_cache = TextCache()
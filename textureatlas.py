@@ -0,0 +1,152 @@
+"""
+
+This module contains functions which are responsible for packing all
+textures into one atlas surface scaled by given factor and caching it
+on disk, so next start loads a single image
+
+Cache is a PNG with a JSON index of rects next to it, one pair per scale
+factor. Index stores key made of scale factor and texture names, sizes
+and modification times, atlas is built again when any texture changes.
+
+"""
+
+import hashlib
+import json
+import os
+
+import pygame as pg
+from pygame import image as img
+from pygame.surface import Surface
+
+VERSION = 1
+CACHE_DIR = "resources/cache"
+MAX_WIDTH = 2048
+
+
+# exact scale is in the name, close factors never share a file
+def cache_paths(scale):
+    name = os.path.join(CACHE_DIR, "atlas_{!r}".format(float(scale)))
+    return name + ".png", name + ".json"
+
+
+def source_key(names, directory, scale):
+    key = hashlib.sha1("{}:{!r};".format(VERSION, float(scale)).encode(
+        "utf-8"))
+
+    for name in names:
+        info = os.stat(os.path.join(directory, name + ".png"))
+        key.update("{}:{}:{};".format(name, info.st_size,
+                                      info.st_mtime_ns).encode("utf-8"))
+
+    return key.hexdigest()
+
+
+# shelf packing, tallest textures first, returns rects in form of
+# (x, y, width, height) keyed by name and size of the atlas
+def pack(sizes):
+    width = max([MAX_WIDTH] + [size[0] for size in sizes.values()])
+    rects = {}
+    x = y = shelf_height = used_width = 0
+
+    for name in sorted(sizes, key=lambda name: (-sizes[name][1], name)):
+        w, h = sizes[name]
+
+        if x + w > width:
+            x = 0
+            y += shelf_height
+            shelf_height = 0
+
+        rects[name] = (x, y, w, h)
+        x += w
+        used_width = max(used_width, x)
+        shelf_height = max(shelf_height, h)
+
+    return rects, (max(used_width, 1), max(y + shelf_height, 1))
+
+
+# textures are decoded on executor when one is given, converting and
+# scaling needs display so it is left to the calling thread
+def build(names, directory, scale, executor=None):
+    paths = [os.path.join(directory, name + ".png") for name in names]
+    decoded = (map(img.load, paths) if executor is None else
+               executor.map(img.load, paths))
+    textures = {}
+
+    for name, texture in zip(names, decoded):
+        texture = texture.convert_alpha()
+
+        if scale != 1:
+            size = (max(round(texture.get_width() * scale), 1),
+                    max(round(texture.get_height() * scale), 1))
+            texture = pg.transform.smoothscale(texture, size)
+
+        textures[name] = texture
+
+    rects, size = pack({name: texture.get_size()
+                        for name, texture in textures.items()})
+
+    # atlas starts transparent, max copies pixels without blending
+    atlas = Surface(size, pg.SRCALPHA)
+    for name, texture in textures.items():
+        atlas.blit(texture, rects[name][:2], special_flags=pg.BLEND_RGBA_MAX)
+
+    return atlas, rects
+
+
+def write(atlas, rects, key, scale):
+    image_path, index_path = cache_paths(scale)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    # image goes first, index pointing at half written image is never left
+    temporary_path = image_path[:-len(".png")] + ".tmp.png"
+    img.save(atlas, temporary_path)
+    os.replace(temporary_path, image_path)
+
+    with open(index_path + ".tmp", "w") as index_file:
+        json.dump({"key": key, "rects": rects}, index_file)
+    os.replace(index_path + ".tmp", index_path)
+
+
+# returns atlas and rects from cache or None when cache is stale
+def read(key, scale):
+    image_path, index_path = cache_paths(scale)
+
+    try:
+        with open(index_path, "r") as index_file:
+            index = json.load(index_file)
+        if index.get("key") != key:
+            return None
+        atlas = img.load(image_path)
+    except (OSError, ValueError, pg.error):
+        return None
+
+    return atlas, {name: tuple(rect) for name, rect in index["rects"].items()}
+
+
+# safe to run on another thread, returns source key and cached atlas
+# with rects or None when cache is stale
+def read_cached(names, directory, scale):
+    key = source_key(names, directory, scale)
+    return key, read(key, scale)
+
+
+# textures are subsurfaces of the atlas, they share its pixels and
+# must not be modified
+def finish(names, directory, scale, key, cached, executor=None):
+    if cached is None:
+        atlas, rects = build(names, directory, scale, executor)
+        try:
+            write(atlas, rects, key, scale)
+        except (OSError, pg.error) as error:
+            print("[INFO] Texture atlas not cached:", error)
+    else:
+        atlas, rects = cached
+
+    atlas = atlas.convert_alpha()
+
+    return {name: atlas.subsurface(rects[name]) for name in names}
+
+
+def load(names, directory, scale=1, executor=None):
+    key, cached = read_cached(names, directory, scale)
+    return finish(names, directory, scale, key, cached, executor)
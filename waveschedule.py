@@ -0,0 +1,87 @@
+"""
+
+This module contains class WaveSchedule which is responsible for
+turning wave schedule from level data into enemies of every wave with
+their spawn times
+
+Schedule has "intervals", seconds from start of each wave to the next
+one (last value is used for all later waves), and "groups". Default
+schedule is resources/wave_schedule.json, "schedule" of a level in
+resources/level_data.json replaces any of its keys. Group is
+enemies of one "type" spawned "spacing" seconds apart in every wave from
+"first_wave" to "last_wave", "count" of them in the first wave and
+"growth" more in each next one. Groups of a wave come one after another
+in listed order, "delay" is pause before the group and "spawn" pins it
+to one spawn point instead of spawns taking turns.
+
+"""
+
+
+class WaveSchedule:
+    """
+
+    Enemies of every wave in form of (seconds from wave start,
+    enemy type, spawn id or None), compiled once per level.
+
+    """
+
+    SCHEDULE_KEYS = ("intervals", "groups")
+    GROUP_KEYS = ("type", "spacing")
+
+    def __init__(self, schedule, max_wave, enemy_types, spawn_count):
+        WaveSchedule.require(schedule, WaveSchedule.SCHEDULE_KEYS,
+                             "wave schedule")
+        self.intervals = schedule["intervals"]
+
+        if not self.intervals:
+            raise ValueError("wave schedule without intervals")
+
+        # index 0 is time before the first wave
+        self.waves = [[] for _ in range(max_wave + 1)]
+
+        for group_idx, group in enumerate(schedule["groups"]):
+            WaveSchedule.require(group, WaveSchedule.GROUP_KEYS,
+                                 "group {} of wave schedule".format(group_idx))
+
+            if not 0 <= group["type"] < enemy_types:
+                raise ValueError("unknown enemy type {}".format(
+                    group["type"]))
+
+            spawn_id = group.get("spawn")
+            if spawn_id is not None and not 0 <= spawn_id < spawn_count:
+                raise ValueError("unknown spawn {}".format(spawn_id))
+
+            if group["spacing"] <= 0:
+                raise ValueError("spacing has to be positive")
+
+        for wave_number in range(1, max_wave + 1):
+            time = 0
+            enemies = self.waves[wave_number]
+
+            for group in schedule["groups"]:
+                first_wave = group.get("first_wave", 1)
+                last_wave = group.get("last_wave", max_wave)
+
+                if not first_wave <= wave_number <= last_wave:
+                    continue
+
+                count = int(group.get("count", 1) + group.get("growth", 0) *
+                            (wave_number - first_wave))
+                time += group.get("delay", 0)
+
+                for _ in range(count):
+                    enemies.append((time, group["type"], group.get("spawn")))
+                    time += group["spacing"]
+
+    @staticmethod
+    def require(mapping, keys, where):
+        for key in keys:
+            if key not in mapping:
+                raise ValueError("missing {!r} in {}".format(key, where))
+
+    def wave(self, wave_number):
+        return self.waves[wave_number]
+
+    # seconds from start of given wave to start of the next one
+    def interval(self, wave_number):
+        return self.intervals[min(wave_number, len(self.intervals)) - 1]